@@ -0,0 +1,134 @@
+import hashlib
+import math
+import time
+from datetime import datetime
+from functools import wraps
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+TAG_KEY = 'page_tag:{}'
+PAGE_KEY = 'tagged_page:{}'
+
+
+def new_version():
+    return f'{time.time():.6f}:{uuid4().hex}'
+
+
+def version_time(version):
+    return float(version.split(':', 1)[0])
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; потерянный тег получает новую версию.
+
+    Версия — время сброса и случайная часть, а не счётчик: если кэш
+    вытеснит тег, прежняя версия не вернётся и старые страницы не станут
+    снова актуальными.
+    """
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) or new_version() for key in keys]
+
+
+def bump_tags(tags):
+    cache.set_many(
+        {TAG_KEY.format(tag): new_version() for tag in tags}, timeout=None
+    )
+
+
+def invalidate_tags(*tags):
+    """Сбрасывает теги сейчас и ещё раз после фиксации транзакции.
+
+    Повторный сброс не даёт странице, собранной до фиксации, остаться
+    в кэше под новой версией тега.
+    """
+    bump_tags(tags)
+    transaction.on_commit(lambda: bump_tags(tags))
+
+
+def last_modified(versions):
+    """Время изменения для Last-Modified или None.
+
+    HTTP-дата точна до секунды, поэтому время округляется вверх, а пока
+    эта секунда не прошла, Last-Modified не отдаётся: изменение в ту же
+    секунду иначе дало бы клиенту 304 на устаревшую страницу.
+    """
+    modified = math.ceil(max(map(version_time, versions), default=0))
+    if modified > time.time():
+        return None
+    return datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def page_state(request, tags, *args, **kwargs):
+    """Ключ страницы и время её изменения, один раз на запрос.
+
+    Ключ различает пользователя и его CSRF-секрет: после нового входа
+    страница с формой не отдаётся ни из кэша, ни ответом 304.
+    """
+    state = getattr(request, 'page_state', None)
+    if state is None:
+        page_tags = tags(request, *args, **kwargs)
+        versions = tag_versions(page_tags)
+        user = request.user
+        viewer = 'anon'
+        if user.is_authenticated:
+            # Формы страницы несут CSRF-токен, который меняется при входе
+            viewer = f'{user.pk}:{request.META.get("CSRF_COOKIE", "")}'
+        parts = [viewer, request.get_full_path(), *page_tags, *versions]
+        digest = hashlib.md5('\x00'.join(parts).encode()).hexdigest()
+        state = request.page_state = (digest, last_modified(versions))
+    return state
+
+
+def conditional_tagged_page(tags):
+    """Отвечает 304 по ETag и Last-Modified, посчитанным из версий тегов.
+
+    Last-Modified отдаётся только гостям: время не различает
+    пользователей, а ETag включает того, кто смотрит страницу.
+    """
+    def etag(request, *args, **kwargs):
+        return page_state(request, tags, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return page_state(request, tags, *args, **kwargs)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def cache_tagged_page(timeout, tags):
+    """Кэширует страницу до истечения timeout или сброса любого её тега.
+
+    ``tags(request, *args, **kwargs)`` возвращает теги, от которых
+    зависит страница. Страница хранится отдельно для каждого
+    пользователя, потому что шапка и кнопки зависят от него. Повторный
+    запрос с валидатором получает 304 без чтения кэша страниц.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            digest = page_state(request, tags, *args, **kwargs)[0]
+            key = PAGE_KEY.format(digest)
+            response = cache.get(key)
+            if response is not None:
+                request.page_cache = 'hit'
+                return response
+            request.page_cache = 'miss'
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response, timeout)
+            return response
+        return conditional_tagged_page(tags)(wrapper)
+    return decorator
@@ -0,0 +1,134 @@
+import mimetypes
+import mmap
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Имя от ContentAddressedStorage: содержимое под ним не меняется
+HASHED_NAME = re.compile(r'(?:^|/)[0-9a-f]{64}\.\w+$')
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header, size):
+    """(начало, конец) включительно для одного диапазона Range.
+
+    None — заголовка нет или он не разобран, тогда отдаётся весь файл;
+    False — диапазон за пределами файла.
+    """
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N — последние N байт
+        length = int(end)
+        if not length:
+            return False
+        start, end = max(size - length, 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return False
+    return start, end
+
+
+def mapped_range(path, start, end):
+    """Байты файла с start по end включительно через mmap, порциями."""
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(start, end + 1, CHUNK_SIZE):
+                yield mapped[offset:min(offset + CHUNK_SIZE, end + 1)]
+
+
+def sendfile_response(path, name):
+    """Пустой ответ, тело которого отдаст веб-сервер по MEDIA_SENDFILE.
+
+    Путь кодируется как URI: старые имена с кириллицей или пробелами
+    Django иначе закодировал бы по MIME, и веб-сервер не нашёл бы файл.
+    """
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + name)
+    else:
+        response['X-Sendfile'] = quote(path)
+    return response
+
+
+def cache_control(name):
+    if HASHED_NAME.search(name):
+        return f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MUTABLE_MAX_AGE}'
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT с ETag, Range и кэшированием.
+
+    Навсегда (immutable) кэшируются только имена с sha256 содержимого.
+
+    Если задан MEDIA_SENDFILE, файл отдаёт веб-сервер, а приложение
+    только проверяет путь и условные заголовки. Иначе целый файл идёт
+    через FileResponse, который WSGI-сервер передаёт в sendfile, а
+    диапазон читается через mmap.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404
+    size = stats.st_size
+    etag = quote_etag(f'{stats.st_mtime_ns:x}-{size:x}')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stats.st_mtime))
+    if response is None:
+        response = file_response(request, full_path, path, size, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stats.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+def file_response(request, full_path, name, size, etag):
+    content_type = mimetypes.guess_type(full_path)[0]
+    content_type = content_type or 'application/octet-stream'
+    if settings.MEDIA_SENDFILE:
+        response = sendfile_response(full_path, name)
+        response['Content-Type'] = content_type
+        return response
+    byte_range = None
+    if request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'),
+                                content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            mapped_range(full_path, start, end),
+            status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
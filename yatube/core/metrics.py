@@ -0,0 +1,237 @@
+import hmac
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+# Заголовки, которые добавляет обратный прокси
+PROXY_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def label_set(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(
+        f'{name}="{escape(value)}"' for name, value in pairs)
+
+
+def number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, label_set(self.labels, labels), value
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = (*buckets, float('inf'))
+
+    def observe(self, labels, value):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+        counts = state[0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield (f'{self.name}_bucket',
+                       label_set(self.labels, labels, [('le', number(bound))]),
+                       cumulative)
+            labels = label_set(self.labels, labels)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class Registry:
+    """Метрики процесса. Каждый процесс сервера отдаёт свои."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def clear(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.values.clear()
+
+    def exposition(self):
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.documentation}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    lines.append(f'{name}{labels} {number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.add(Counter(
+    'yatube_requests_total', 'Запросы по view, методу и статусу.',
+    ('view', 'method', 'status')))
+LATENCY = REGISTRY.add(Histogram(
+    'yatube_request_duration_seconds', 'Время ответа view.',
+    ('view',), LATENCY_BUCKETS))
+QUERIES = REGISTRY.add(Histogram(
+    'yatube_db_queries', 'Запросов к базе за один ответ.',
+    ('view',), QUERY_BUCKETS))
+DB_TIME = REGISTRY.add(Counter(
+    'yatube_db_duration_seconds_total', 'Время запросов к базе.',
+    ('view',)))
+TEMPLATE_TIME = REGISTRY.add(Counter(
+    'yatube_template_render_seconds_total', 'Время рендера шаблонов.',
+    ('view',)))
+PAGE_CACHE = REGISTRY.add(Counter(
+    'yatube_page_cache_total',
+    'Исход кэша страниц: hit, miss или not_modified (304).',
+    ('view', 'result')))
+
+local = threading.local()
+
+
+def instrument_templates():
+    """Оборачивает Template.render, чтобы время шло текущему запросу.
+
+    Оборачивается шаблон верхнего уровня, поэтому вложенные include
+    отдельно не считаются.
+    """
+    render = Template.render
+    if getattr(render, 'timed', False):
+        return
+
+    def timed_render(self, *args, **kwargs):
+        if getattr(local, 'templates', None) is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            local.templates += time.perf_counter() - started
+    timed_render.timed = True
+    Template.render = timed_render
+
+
+class MetricsMiddleware:
+    """Считает по имени view запросы, время, запросы к базе и шаблоны.
+
+    Время запросов к базе снимается через execute_wrapper, без
+    CursorDebugWrapper, поэтому middleware можно держать включённым.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_templates()
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        database = [0, 0.0]
+
+        def timed_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                database[0] += 1
+                database[1] += time.perf_counter() - started
+
+        local.templates = 0.0
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timed_query))
+                response = self.get_response(request)
+        finally:
+            templates, local.templates = local.templates, None
+        elapsed = time.perf_counter() - started
+        self.record(request, response, elapsed, database, templates)
+        return response
+
+    @staticmethod
+    def record(request, response, elapsed, database, templates):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        if view == 'metrics':
+            return
+        page_cache = getattr(request, 'page_cache', None)
+        if page_cache is None and response.status_code == 304:
+            page_cache = 'not_modified'
+        with REGISTRY.lock:
+            method = request.method if request.method in METHODS else 'other'
+            REQUESTS.inc((view, method, str(response.status_code)))
+            LATENCY.observe((view,), elapsed)
+            QUERIES.observe((view,), database[0])
+            DB_TIME.inc((view,), database[1])
+            TEMPLATE_TIME.inc((view,), templates)
+            if page_cache is not None:
+                PAGE_CACHE.inc((view, page_cache))
+
+
+def allowed(request):
+    """Запрос с METRICS_TOKEN или, без токена, напрямую с внутреннего IP.
+
+    Через обратный прокси REMOTE_ADDR всегда адрес самого прокси, поэтому
+    запросы с его заголовками по IP не пускаются.
+    """
+    if settings.METRICS_TOKEN:
+        return hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            f'Bearer {settings.METRICS_TOKEN}'.encode(),
+        )
+    return (request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+            and not any(header in request.META for header in PROXY_HEADERS))
+
+
+def metrics(request):
+    """Метрики в формате Prometheus, только для allowed-запросов."""
+    if not allowed(request):
+        raise Http404
+    return HttpResponse(REGISTRY.exposition(), content_type=CONTENT_TYPE)
@@ -0,0 +1,124 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.dispatch import Signal
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SPACES = re.compile(r'\s+')
+# Служебные запросы транзакций повторяются законно
+IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+# Обёртки запросов, которые не считаются местом вызова
+WRAPPERS = {
+    os.path.join(settings.BASE_DIR, 'core', 'nplusone.py'),
+    os.path.join(settings.BASE_DIR, 'core', 'metrics.py'),
+}
+
+logger = logging.getLogger(__name__)
+detected = Signal(providing_args=['request', 'problems'])
+
+
+class NPlusOneError(Exception):
+    """Запрос повторился в одном ответе больше NPLUSONE_THRESHOLD раз."""
+
+
+def shape(sql):
+    """SQL без значений: одинаковый у запросов, отличающихся параметрами."""
+    sql = IN_LIST.sub('IN (...)', sql)
+    sql = LITERAL.sub('?', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def is_project(filename):
+    return (filename.startswith(settings.BASE_DIR)
+            and 'site-packages' not in filename
+            and filename not in WRAPPERS)
+
+
+def location():
+    """Строка шаблона и строка кода проекта, откуда пришёл запрос."""
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and template is None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                name = origin.template_name or origin.name
+                template = f'{name}:{token.lineno}'
+        elif code is None and is_project(frame.f_code.co_filename):
+            filename = os.path.relpath(frame.f_code.co_filename,
+                                       settings.BASE_DIR)
+            code = f'{filename}:{frame.f_lineno}'
+        frame = frame.f_back
+    return ' <- '.join(filter(None, (code, template))) or '<unknown>'
+
+
+class QueryLog:
+    """Запросы ответа, сгруппированные по форме, с местами вызова."""
+
+    def __init__(self):
+        self.shapes = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(IGNORED):
+            self.shapes[shape(sql)][location()] += 1
+        return execute(sql, params, many, context)
+
+    def problems(self, threshold):
+        """(форма, число повторов, самое частое место) сверх порога."""
+        found = []
+        for sql, places in self.shapes.items():
+            count = sum(places.values())
+            if count > threshold:
+                found.append((sql, count, places.most_common(1)[0][0]))
+        return sorted(found, key=lambda problem: -problem[1])
+
+
+@contextmanager
+def query_log():
+    log = QueryLog()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
+
+
+def describe(problems):
+    return '\n'.join(
+        f'{count}x {sql}\n    в {place}' for sql, count, place in problems)
+
+
+class NPlusOneMiddleware:
+    """Находит N+1: одну форму SQL, повторённую в ответе много раз.
+
+    Включается NPLUSONE_ENABLED (по умолчанию в DEBUG) и пишет в лог
+    форму запроса, число повторов и строку шаблона или кода. При
+    NPLUSONE_RAISE ответ падает с NPlusOneError.
+    """
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with query_log() as log:
+            response = self.get_response(request)
+        problems = log.problems(settings.NPLUSONE_THRESHOLD)
+        if problems:
+            message = f'N+1 в {request.path}:\n{describe(problems)}'
+            logger.warning(message)
+            detected.send(sender=self.__class__, request=request,
+                          problems=problems)
+            if settings.NPLUSONE_RAISE:
+                raise NPlusOneError(message)
+        return response
@@ -0,0 +1,45 @@
+"""Плагин pytest: N+1 в запросах тестового клиента.
+
+Подключается через pytest_plugins. В строгом режиме (nplusone_strict
+в pytest.ini или --nplusone-strict) тест, в котором middleware нашёл
+N+1, падает; иначе находки становятся предупреждениями.
+"""
+import warnings
+
+import pytest
+
+from core.nplusone import describe, detected
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+def pytest_addoption(parser):
+    parser.addini('nplusone_strict', type='bool', default=False,
+                  help='Падать на N+1 в запросах тестового клиента.')
+    parser.addoption('--nplusone-strict', action='store_true',
+                     help='То же, что nplusone_strict = true.')
+
+
+@pytest.fixture(autouse=True)
+def nplusone(request, settings):
+    settings.NPLUSONE_ENABLED = True
+    settings.NPLUSONE_RAISE = False
+    found = []
+
+    def collect(sender, problems, **kwargs):
+        found.append((kwargs['request'].path, problems))
+
+    detected.connect(collect, weak=False, dispatch_uid='pytest_nplusone')
+    yield found
+    detected.disconnect(dispatch_uid='pytest_nplusone')
+    if not found:
+        return
+    report = '\n'.join(f'{path}:\n{describe(problems)}'
+                       for path, problems in found)
+    config = request.config
+    if config.getoption('nplusone_strict') or config.getini(
+            'nplusone_strict'):
+        pytest.fail(f'N+1 запросы:\n{report}', pytrace=False)
+    warnings.warn(report, NPlusOneWarning)
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import posixpath
+from uuid import uuid4
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def walk(storage, path=''):
+    """Все файлы каталога path хранилища, рекурсивно."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит каждое содержимое один раз под именем из его sha256.
+
+    Каталог из upload_to дополняется подкаталогами из первых символов
+    хэша (``posts/ab/cd/abcd….jpg``), чтобы ни в одном каталоге не
+    копились миллионы файлов. Повторная загрузка той же картинки
+    возвращает имя уже сохранённого файла.
+    """
+
+    shard_depth = 2
+    shard_width = 2
+
+    def content_name(self, name, content):
+        # sha256, уже посчитанный при чтении метаданных картинки
+        digest = getattr(content, 'sha256', None) or content_hash(content)
+        extension = os.path.splitext(name)[1].lower()
+        shards = [
+            digest[i * self.shard_width:(i + 1) * self.shard_width]
+            for i in range(self.shard_depth)
+        ]
+        return posixpath.join(
+            posixpath.dirname(name), *shards, digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя задаёт содержимое в _save, stat здесь не нужен
+        return name
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # Совпавший файл мог быть сиротой: свежее время изменения не даёт
+        # cleanup_images удалить его, пока новый пост не сохранён
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # Файл появляется под итоговым именем целиком: одинаковое
+        # содержимое, записанное параллельно, просто заменяет себя
+        temporary = super()._save(
+            posixpath.join(posixpath.dirname(name), f'.{uuid4().hex}.tmp'),
+            content,
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
@@ -0,0 +1,41 @@
+from django import template
+
+register = template.Library()
+
+
+def window(number, num_pages, on_each_side=2, on_ends=1):
+    """Номера страниц вокруг текущей и у краёв, None — пропуск.
+
+    Считается по границам, а не по page_range, поэтому длина не зависит
+    от числа страниц.
+    """
+    start = max(number - on_each_side, 1)
+    end = min(number + on_each_side, num_pages)
+    head = min(on_ends, start - 1)
+    tail = max(num_pages - on_ends, end)
+    # Пропуск в одну страницу короче показать номером
+    if start == head + 2:
+        start -= 1
+    if tail == end + 1:
+        end += 1
+    yield from range(1, head + 1)
+    if start > head + 1:
+        yield None
+    yield from range(start, end + 1)
+    if tail > end:
+        yield None
+    yield from range(tail + 1, num_pages + 1)
+
+
+@register.simple_tag
+def page_window(page_obj, on_each_side=2, on_ends=1):
+    return list(window(page_obj.number, page_obj.paginator.num_pages,
+                       on_each_side, on_ends))
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, number):
+    """Ссылка на страницу number с остальными параметрами запроса."""
+    query = context['request'].GET.copy()
+    query['page'] = number
+    return f'?{query.urlencode()}'
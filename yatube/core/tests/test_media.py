@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = b'0123456789'
+URL = settings.MEDIA_URL + 'posts/file.txt'
+HASHED = 'posts/ab/cd/' + 'abcd' * 16 + '.txt'
+LEGACY = 'posts/кот на окне.txt'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ('posts/file.txt', HASHED, LEGACY):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_full_file(self):
+        """Файл отдаётся целиком с ETag и перепроверяемым кэшированием."""
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_hashed_name_immutable(self):
+        """Имя с sha256 содержимого кэшируется навсегда."""
+        response = self.client.get(settings.MEDIA_URL + HASHED)
+        self.assertEqual(
+            response['Cache-Control'],
+            f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable')
+
+    def test_not_modified(self):
+        """Повторный запрос с If-None-Match получает 304."""
+        etag = self.client.get(URL)['ETag']
+        response = self.client.get(URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        """Диапазоны отдаются с 206, невыполнимый — с 416."""
+        cases = {
+            'bytes=2-4': (206, b'234', 'bytes 2-4/10'),
+            'bytes=7-': (206, b'789', 'bytes 7-9/10'),
+            'bytes=-2': (206, b'89', 'bytes 8-9/10'),
+            'bytes=20-': (416, b'', 'bytes */10'),
+        }
+        for header, (status, body, content_range) in cases.items():
+            with self.subTest(range=header):
+                response = self.client.get(URL, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response['Content-Range'], content_range)
+                if response.streaming:
+                    self.assertEqual(
+                        b''.join(response.streaming_content), body)
+
+    def test_stale_if_range_ignored(self):
+        """При устаревшем If-Range файл отдаётся целиком."""
+        response = self.client.get(URL, HTTP_RANGE='bytes=2-4',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_outside_media_root(self):
+        """Пути вне MEDIA_ROOT и каталоги не отдаются."""
+        for path in ('../settings.py', 'posts/', 'posts/missing.txt'):
+            with self.subTest(path=path):
+                response = self.client.get(settings.MEDIA_URL + path)
+                self.assertEqual(response.status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        """С MEDIA_SENDFILE тело отдаёт веб-сервер."""
+        response = self.client.get(URL)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         settings.MEDIA_ACCEL_PREFIX + 'posts/file.txt')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect_quoted(self):
+        """Кириллица и пробелы в пути кодируются как URI."""
+        response = self.client.get(settings.MEDIA_URL + LEGACY)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_ACCEL_PREFIX
+            + 'posts/%D0%BA%D0%BE%D1%82%20%D0%BD%D0%B0%20'
+              '%D0%BE%D0%BA%D0%BD%D0%B5.txt')
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import REGISTRY
+from posts.models import Post, User
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Post.objects.create(
+            text='Тестовый пост',
+            author=User.objects.create_user(username='author'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        REGISTRY.clear()
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_view_metrics(self):
+        """Запросы, время, база, шаблоны и кэш считаются по имени view."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        text = self.metrics()
+        self.assertIn('yatube_requests_total{view="posts:index",'
+                      'method="GET",status="200"} 2', text)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="posts:index"} 2', text)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:index",le="+Inf"} 2', text)
+        self.assertIn('yatube_page_cache_total{view="posts:index",'
+                      'result="miss"} 1', text)
+        self.assertIn('yatube_page_cache_total{view="posts:index",'
+                      'result="hit"} 1', text)
+        self.assertRegex(text, r'yatube_template_render_seconds_total'
+                               r'\{view="posts:index"\} [0-9.e-]+')
+        self.assertRegex(text, r'yatube_db_queries_sum'
+                               r'\{view="posts:index"\} [1-9]')
+        self.assertNotIn('view="metrics"', text)
+
+    def test_not_modified(self):
+        """Ответ 304 по валидатору виден как not_modified."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertIn('result="not_modified"} 1', self.metrics())
+
+    @override_settings(METRICS_ALLOWED_IPS=())
+    def test_only_internal(self):
+        """Снаружи эндпоинт метрик не виден."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_proxied_request_hidden(self):
+        """Запрос через прокси с 127.0.0.1 метрики не получает."""
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        """С METRICS_TOKEN нужен заголовок Authorization с токеном."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        response = self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret',
+            HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(response.status_code, 200)
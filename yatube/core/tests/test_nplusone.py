@@ -0,0 +1,69 @@
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.nplusone import NPlusOneError, NPlusOneMiddleware, query_log, shape
+from posts.models import Comment, Post, User
+
+COMMENTS = 6
+
+
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        post = Post.objects.create(
+            text='Тестовый пост',
+            author=User.objects.create_user(username='author'),
+        )
+        for number in range(COMMENTS):
+            Comment.objects.create(
+                post=post,
+                author=User.objects.create_user(username=f'reader-{number}'),
+                text='Комментарий',
+            )
+
+    def render_comments(self, comments):
+        return Template(
+            '{% for comment in comments %}\n'
+            '{{ comment.author.username }}\n'
+            '{% endfor %}'
+        ).render(Context({'comments': comments}))
+
+    def test_shape_ignores_values(self):
+        """Запросы с разными значениями имеют одну форму."""
+        self.assertEqual(
+            shape("SELECT * FROM t WHERE id = 5 AND name = 'a''b'"),
+            shape('SELECT * FROM t WHERE id = 7 AND name = \'c\''))
+        self.assertEqual(shape('SELECT 1 FROM t WHERE id IN (%s, %s)'),
+                         shape('SELECT 1 FROM t WHERE id IN (%s)'))
+
+    def test_template_line_reported(self):
+        """Повторы находятся и указывают на строку шаблона."""
+        with query_log() as log:
+            self.render_comments(Comment.objects.all())
+        problems = log.problems(threshold=COMMENTS - 1)
+        self.assertEqual(len(problems), 1)
+        sql, count, place = problems[0]
+        self.assertIn('auth_user', sql)
+        self.assertEqual(count, COMMENTS)
+        self.assertTrue(place.endswith(':2'), place)
+
+    def test_select_related_clean(self):
+        """С select_related повторов нет."""
+        with query_log() as log:
+            self.render_comments(Comment.objects.select_related('author'))
+        self.assertEqual(log.problems(threshold=1), [])
+
+    @override_settings(NPLUSONE_ENABLED=True, NPLUSONE_RAISE=True,
+                       NPLUSONE_THRESHOLD=COMMENTS - 1)
+    def test_strict_middleware(self):
+        """В строгом режиме ответ с N+1 падает."""
+        def view(request):
+            return HttpResponse(self.render_comments(Comment.objects.all()))
+
+        middleware = NPlusOneMiddleware(view)
+        with self.assertLogs('core.nplusone', 'WARNING') as logs:
+            with self.assertRaises(NPlusOneError):
+                middleware(RequestFactory().get('/'))
+        self.assertIn('6x SELECT', logs.output[0])
@@ -0,0 +1,32 @@
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+
+from core.templatetags.pagination import window
+
+
+class PageWindowTests(TestCase):
+    def test_window(self):
+        """Окно вокруг текущей страницы, края и пропуски."""
+        cases = {
+            (1, 1): [1],
+            (1, 10): [1, 2, 3, None, 10],
+            (5, 10): [1, 2, 3, 4, 5, 6, 7, None, 10],
+            (10, 10): [1, None, 8, 9, 10],
+            (5000, 10000): [1, None, 4998, 4999, 5000, 5001, 5002,
+                            None, 10000],
+        }
+        for (number, num_pages), expected in cases.items():
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(list(window(number, num_pages)), expected)
+
+    def test_links_keep_query(self):
+        """Ссылки на страницы сохраняют остальные параметры запроса."""
+        page_obj = Paginator(range(100000), 10).page(5000)
+        request = RequestFactory().get('/search/', {'q': 'кот', 'page': 5000})
+        html = Template(
+            "{% include 'includes/page_numbers.html' %}"
+        ).render(Context({'page_obj': page_obj, 'request': request}))
+        # 9 номеров и пропусков, «Предыдущая» и «Следующая»
+        self.assertEqual(html.count('<li'), 11)
+        self.assertIn('href="?q=%D0%BA%D0%BE%D1%82&amp;page=4999"', html)
@@ -1,17 +1,62 @@
 from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path
 
+from .bulk_export import FORMATS, export_stream
 from .models import Group, Post, Comment, Follow
+from .search import filter_posts
+
+
+class ExportMixin:
+    """Выгрузка всех строк модели потоком: export/?format=csv&gzip=1."""
+
+    export_name = None
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('export/', self.admin_site.admin_view(self.export_view),
+                 name='%s_%s_export' % info),
+        ] + super().get_urls()
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in FORMATS:
+            raise Http404
+        compress = bool(request.GET.get('gzip'))
+        filename = f'{self.export_name}s.{export_format}'
+        content_type = FORMATS[export_format]
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(
+            export_stream(self.export_name, export_format, compress),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"')
+        return response
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ExportMixin, admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
+    export_name = 'post'
     list_filter = ('pub_date',)
     empty_value_display = settings.STRING_EMPTY
 
+    def get_search_results(self, request, queryset, search_term):
+        # Тот же индекс FTS5, что и у поиска на сайте, вместо LIKE '%q%'
+        if not search_term:
+            return queryset, False
+        return filter_posts(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -20,8 +65,9 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ExportMixin, admin.ModelAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created')
+    export_name = 'comment'
     list_filter = ('author',)
 
 
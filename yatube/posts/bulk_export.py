@@ -0,0 +1,110 @@
+import csv
+import json
+import zlib
+from io import StringIO
+
+from .models import Comment, Post
+
+CHUNK_SIZE = 2000
+# Поля совпадают с тем, что читает import_data
+EXPORTS = {
+    'post': (Post, {
+        'id': 'pk',
+        'text': 'text',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'pub_date': 'pub_date',
+    }),
+    'comment': (Comment, {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(name, chunk_size=CHUNK_SIZE):
+    """Строки модели словарями, порциями по возрастанию id.
+
+    Каждая порция — отдельный короткий запрос по ключу, поэтому память
+    и время жизни курсора не зависят от размера таблицы.
+    """
+    model, fields = EXPORTS[name]
+    columns = list(fields)
+    queryset = model.objects.order_by('pk').values_list(*fields.values())
+    last_pk = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        for row in rows:
+            yield dict(zip(columns, row))
+
+
+def plain(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(
+            {key: plain(value) for key, value in row.items()},
+            ensure_ascii=False,
+        ) + '\n'
+
+
+def csv_lines(rows, columns):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([
+            '' if value is None else plain(value) for value in row.values()
+        ])
+    yield buffer.getvalue()
+
+
+def encoded(lines, size=64 * 1024):
+    """Склеивает строки в куски байтов примерно по size."""
+    parts, length = [], 0
+    for line in lines:
+        data = line.encode()
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(name, export_format='ndjson', compress=False):
+    """Выгрузка модели потоком байтов NDJSON или CSV, по желанию gzip."""
+    rows = export_rows(name)
+    if export_format == 'csv':
+        lines = csv_lines(rows, list(EXPORTS[name][1]))
+    else:
+        lines = ndjson_lines(rows)
+    chunks = encoded(lines)
+    return gzipped(chunks) if compress else chunks
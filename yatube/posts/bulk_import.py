@@ -0,0 +1,350 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import invalidate_tags
+
+from . import cache_tags, timeline
+from .counters import bump
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+class RowError(ValueError):
+    """Строку нельзя импортировать, остальные импортируются дальше."""
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                yield RowError(f'не JSON: {error}')
+
+
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def required(row, field):
+    value = row.get(field)
+    if value in (None, ''):
+        raise RowError(f'нет поля {field}')
+    return value
+
+
+def id_field(row, field):
+    value = row.get(field)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field}: не id {value!r}')
+
+
+def date_field(row, field):
+    if field not in row:
+        return timezone.now()
+    value = parse_datetime(str(row[field]))
+    if value is None:
+        raise RowError(f'{field}: не дата {row[field]!r}')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def assign_new_pks(model, objs, last_pk):
+    """Проставляет id объектам, которым их не вернул bulk_create.
+
+    SQLite выдаёт id строкам без id по возрастанию в порядке вставки, и
+    порция пишется в транзакции, так что это следующие id после last_pk.
+    """
+    missing = [obj for obj in objs if obj.pk is None]
+    if not missing:
+        return
+    pks = model.objects.filter(pk__gt=last_pk).exclude(
+        pk__in=[obj.pk for obj in objs if obj.pk is not None]
+    ).order_by('pk').values_list('pk', flat=True)[:len(missing)]
+    for obj, pk in zip(missing, pks):
+        obj.pk = pk
+
+
+def bump_counts(queryset, field, deltas, key='pk'):
+    """Прибавляет к счётчикам разные значения, один запрос на значение."""
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        bump(queryset.filter(**{f'{key}__in': pks}), **{field: delta})
+
+
+class Lookup:
+    """Естественный ключ -> id, прочитанный из базы один раз.
+
+    Хранит только пары ключ-id, поэтому память растёт с числом
+    пользователей или групп, а не со строками файла.
+    """
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.ids = None
+
+    def load(self):
+        if self.ids is None:
+            self.ids = dict(
+                self.queryset.values_list(self.field, 'pk').iterator())
+        return self.ids
+
+    def __contains__(self, key):
+        return key in self.load()
+
+    def get(self, key):
+        try:
+            return self.load()[key]
+        except KeyError:
+            raise RowError(f'не найден {self.field} {key!r}')
+
+    def refresh(self, keys):
+        """Добавляет id только что созданных строк."""
+        self.load().update(self.queryset.filter(
+            **{f'{self.field}__in': keys}
+        ).values_list(self.field, 'pk'))
+
+
+class Loader(ABC):
+    """Превращает строки файла в объекты и записывает их порциями."""
+
+    model = None
+    # Поле auto_now_add: bulk_create записал бы в него текущее время
+    file_date = None
+
+    def __init__(self, users, groups):
+        self.users = users
+        self.groups = groups
+        self.tags = set()
+        self.rejected = []
+
+    @abstractmethod
+    def build(self, row):
+        """Объект модели из строки файла; RowError, если строка плохая."""
+
+    def filter(self, objs):
+        """Объекты порции, которые можно записать.
+
+        Объект, отброшенный по ошибке в данных, а не как повтор,
+        передаётся в reject, чтобы команда сообщила о его строке.
+        """
+        return objs
+
+    def reject(self, obj, reason):
+        self.rejected.append((obj, reason))
+
+    def create(self, objs):
+        if self.file_date is None:
+            self.model.objects.bulk_create(objs)
+            return
+        dates = [getattr(obj, self.file_date) for obj in objs]
+        last_pk = self.model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.model.objects.bulk_create(objs)
+        assign_new_pks(self.model, objs, last_pk)
+        # Дата из файла возвращается одним UPDATE на порцию
+        for obj, date in zip(objs, dates):
+            setattr(obj, self.file_date, date)
+        self.model.objects.bulk_update(objs, [self.file_date])
+
+    def after(self, objs):
+        """Счётчики и кэш для записанной порции."""
+
+    def write(self, objs):
+        objs = self.filter(objs)
+        if objs:
+            self.create(objs)
+            self.after(objs)
+        return len(objs)
+
+    def flush_tags(self):
+        if self.tags:
+            invalidate_tags(*self.tags)
+            self.tags = set()
+
+
+class UserLoader(Loader):
+    model = User
+
+    def build(self, row):
+        username = required(row, 'username')
+        return User(
+            username=username,
+            email=row.get('email', ''),
+            first_name=row.get('first_name', ''),
+            last_name=row.get('last_name', ''),
+            password=row.get('password') or make_password(None),
+            date_joined=date_field(row, 'date_joined'),
+        )
+
+    def filter(self, objs):
+        fresh = {}
+        for user in objs:
+            if user.username not in self.users:
+                fresh.setdefault(user.username, user)
+        return list(fresh.values())
+
+    def after(self, objs):
+        usernames = [user.username for user in objs]
+        self.users.refresh(usernames)
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=self.users.get(name)) for name in usernames],
+            ignore_conflicts=True,
+        )
+
+
+class GroupLoader(Loader):
+    model = Group
+
+    def build(self, row):
+        return Group(
+            slug=required(row, 'slug'),
+            title=required(row, 'title'),
+            description=row.get('description', ''),
+        )
+
+    def filter(self, objs):
+        fresh = {}
+        for group in objs:
+            if group.slug not in self.groups:
+                fresh.setdefault(group.slug, group)
+        return list(fresh.values())
+
+    def after(self, objs):
+        self.groups.refresh([group.slug for group in objs])
+
+
+class PostLoader(Loader):
+    """Посты, id из файла сохраняется, чтобы на него ссылались комментарии.
+
+    Каждая порция раскладывается в ленты уже существующих подписчиков;
+    подписки, импортированные позже, дополнят ленты сами.
+    """
+
+    model = Post
+    file_date = 'pub_date'
+
+    def build(self, row):
+        group = row.get('group')
+        return Post(
+            pk=id_field(row, 'id'),
+            text=required(row, 'text'),
+            author_id=self.users.get(required(row, 'author')),
+            group_id=self.groups.get(group) if group else None,
+            pub_date=date_field(row, 'pub_date'),
+        )
+
+    def filter(self, objs):
+        fresh = {}
+        for post in objs:
+            fresh.setdefault(post.pk or id(post), post)
+        existing = set(Post.objects.filter(
+            pk__in=[post.pk for post in objs if post.pk]
+        ).values_list('pk', flat=True))
+        return [post for post in fresh.values() if post.pk not in existing]
+
+    def after(self, objs):
+        timeline.fan_out_many(
+            Post.objects.filter(pk__in=[post.pk for post in objs]))
+        authors = Counter(post.author_id for post in objs)
+        groups = Counter(post.group_id for post in objs if post.group_id)
+        bump_counts(UserStats.objects, 'posts_count', authors, 'user_id')
+        bump_counts(Group.objects, 'posts_count', groups)
+        self.tags.add(cache_tags.INDEX)
+        self.tags.update(map(cache_tags.author_tag, authors))
+        self.tags.update(map(cache_tags.group_tag, Group.objects.filter(
+            pk__in=groups).values_list('slug', flat=True)))
+
+
+class CommentLoader(Loader):
+    model = Comment
+    file_date = 'created'
+
+    def build(self, row):
+        required(row, 'post')
+        return Comment(
+            post_id=id_field(row, 'post'),
+            author_id=self.users.get(required(row, 'author')),
+            text=required(row, 'text'),
+            created=date_field(row, 'created'),
+        )
+
+    def filter(self, objs):
+        # Посты проверяются запросом на порцию, а не таблицей в памяти
+        existing = set(Post.objects.filter(
+            pk__in={comment.post_id for comment in objs}
+        ).values_list('pk', flat=True))
+        fresh = []
+        for comment in objs:
+            if comment.post_id in existing:
+                fresh.append(comment)
+            else:
+                self.reject(comment, f'не найден пост {comment.post_id}')
+        return fresh
+
+    def after(self, objs):
+        posts = Counter(comment.post_id for comment in objs)
+        bump_counts(Post.objects, 'comments_count', posts)
+        self.tags.update(map(cache_tags.post_tag, posts))
+
+
+class FollowLoader(Loader):
+    model = Follow
+
+    def build(self, row):
+        user_id = self.users.get(required(row, 'user'))
+        author_id = self.users.get(required(row, 'author'))
+        if user_id == author_id:
+            raise RowError('подписка на самого себя')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def filter(self, objs):
+        pairs = {(follow.user_id, follow.author_id): follow for follow in objs}
+        existing = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'))
+        return [follow for pair, follow in pairs.items()
+                if pair not in existing]
+
+    def after(self, objs):
+        bump_counts(UserStats.objects, 'following_count',
+                    Counter(follow.user_id for follow in objs), 'user_id')
+        bump_counts(UserStats.objects, 'followers_count',
+                    Counter(follow.author_id for follow in objs), 'user_id')
+        pairs = [(follow.user_id, follow.author_id) for follow in objs]
+        timeline.backfill_many(pairs)
+        self.tags.update(cache_tags.follow_tag(*pair) for pair in pairs)
+
+
+LOADERS = {
+    'user': UserLoader,
+    'group': GroupLoader,
+    'post': PostLoader,
+    'comment': CommentLoader,
+    'follow': FollowLoader,
+}
+
+
+def loader(name):
+    return LOADERS[name](
+        Lookup(User.objects.all(), 'username'),
+        Lookup(Group.objects.all(), 'slug'),
+    )
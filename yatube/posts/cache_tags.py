@@ -0,0 +1,67 @@
+from urllib.parse import quote
+
+from .models import Group, Post, User
+
+INDEX = 'index'
+
+
+def group_tag(slug):
+    # Тег входит в ключ кэша, а ключ memcached — только ASCII без пробелов
+    return f'group:{quote(slug, safe="")}'
+
+
+def author_tag(author_id):
+    return f'author:{author_id}'
+
+
+def follow_tag(user_id, author_id):
+    return f'follow:{user_id}:{author_id}'
+
+
+def post_tag(post_id):
+    return f'post:{post_id}'
+
+
+def index_tags(request):
+    return [INDEX]
+
+
+def group_tags(request, slug):
+    return [group_tag(slug)]
+
+
+def profile_tags(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    tags = [author_tag(author_id)]
+    if request.user.is_authenticated:
+        tags.append(follow_tag(request.user.pk, author_id))
+    return tags
+
+
+def post_detail_tags(request, post_id):
+    author_id, slug = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', 'group__slug').first() or (None, None)
+    tags = [post_tag(post_id), author_tag(author_id)]
+    if slug:
+        tags.append(group_tag(slug))
+    return tags
+
+
+def post_changed_tags(post, *group_ids):
+    group_ids = {group_id for group_id in group_ids if group_id}
+    slugs = Group.objects.filter(
+        pk__in=group_ids
+    ).values_list('slug', flat=True)
+    return [INDEX, post_tag(post.pk), author_tag(post.author_id),
+            *map(group_tag, slugs)]
+
+
+def group_changed_tags(group, *slugs):
+    authors = Post.objects.filter(
+        group=group
+    ).order_by().values_list('author_id', flat=True).distinct()
+    return [INDEX, *map(group_tag, {group.slug, *slugs}),
+            *map(author_tag, authors)]
@@ -0,0 +1,115 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Case, Count, F, OuterRef, Q,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Group, Post, UserStats
+
+
+def shifted(field, delta):
+    """F(field) + delta; уменьшение не уходит ниже нуля.
+
+    Разъехавшийся с данными нулевой счётчик иначе нарушил бы CHECK
+    положительного поля, и удаление упало бы с IntegrityError.
+    """
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def bump(queryset, **deltas):
+    return queryset.update(
+        **{field: shifted(field, delta) for field, delta in deltas.items()}
+    )
+
+
+def bump_user(user_id, **deltas):
+    updated = bump(UserStats.objects.filter(user_id=user_id), **deltas)
+    if not updated and min(deltas.values()) > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        bump(UserStats.objects.filter(user_id=user_id), **deltas)
+
+
+def count_post(post, delta):
+    bump_user(post.author_id, posts_count=delta)
+    if post.group_id:
+        bump(Group.objects.filter(pk=post.group_id), posts_count=delta)
+
+
+def move_post(post, old_group_id):
+    if old_group_id == post.group_id:
+        return
+    if old_group_id:
+        bump(Group.objects.filter(pk=old_group_id), posts_count=-1)
+    if post.group_id:
+        bump(Group.objects.filter(pk=post.group_id), posts_count=1)
+
+
+def count_comment(comment, delta):
+    bump(Post.objects.filter(pk=comment.post_id), comments_count=delta)
+
+
+def count_follow(follow, delta):
+    bump_user(follow.user_id, following_count=delta)
+    if delta > 0:
+        bump_user(follow.author_id, followers_count=delta)
+        return
+    # Автор, уходящий ниже порога, запоминается в том же UPDATE
+    UserStats.objects.filter(user_id=follow.author_id).update(
+        followers_count=shifted('followers_count', delta),
+        feed_pulled=Case(
+            When(followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS,
+                 then=Value(True)),
+            default=F('feed_pulled'),
+            output_field=BooleanField(),
+        ),
+    )
+
+
+def actual_count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+COUNTERS = (
+    (UserStats, {
+        'posts_count': (Post, 'author'),
+        'followers_count': (Follow, 'author'),
+        'following_count': (Follow, 'user'),
+    }),
+    (Group, {'posts_count': (Post, 'group')}),
+    (Post, {'comments_count': (Comment, 'post')}),
+)
+
+
+def recount_chunk(model, fields, pks):
+    """Пересчитывает счётчики строк ``pks``, возвращает число исправленных."""
+    actual = {
+        f'actual_{field}': actual_count(*source)
+        for field, source in fields.items()
+    }
+    drift = reduce(or_, (
+        ~Q(**{field: F(f'actual_{field}')}) for field in fields
+    ))
+    with transaction.atomic():
+        drifted = list(
+            model.objects.filter(pk__in=pks)
+            .annotate(**actual)
+            .filter(drift)
+            .values_list('pk', flat=True)
+        )
+        if drifted:
+            model.objects.filter(pk__in=drifted).update(**{
+                field: actual_count(*source)
+                for field, source in fields.items()
+            })
+    return len(drifted)
@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Post, Comment
+from .uploads import ImageRejected, normalize_upload
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,16 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Новая картинка проверяется и очищается от EXIF в пуле процессов."""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return normalize_upload(image)
+        except ImageRejected as error:
+            raise forms.ValidationError(str(error), code='invalid_image')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
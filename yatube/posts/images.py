@@ -0,0 +1,106 @@
+import base64
+import hashlib
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Значения EXIF Orientation, при которых картинка повёрнута на 90°
+ROTATED = {5, 6, 7, 8}
+ORIENTATION = 0x0112
+PLACEHOLDER_SIDE = 16
+
+
+def image_metadata(file):
+    """Размеры с учётом EXIF-поворота, вес, формат и sha256 картинки.
+
+    Читает только заголовок картинки и один проход по байтам файла.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image_format = image.format or ''
+        if image.getexif().get(ORIENTATION) in ROTATED:
+            width, height = height, width
+    file.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_size': size,
+        'image_format': image_format,
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def oriented(image):
+    """Картинка, повёрнутая по EXIF Orientation.
+
+    Без поворота возвращается та же картинка: exif_transpose скопировал
+    бы её целиком и в этом случае.
+    """
+    if image.getexif().get(ORIENTATION, 1) == 1:
+        return image
+    return ImageOps.exif_transpose(image)
+
+
+def make_placeholder(image):
+    """Картинка не больше 16 px по большей стороне в виде data URI.
+
+    Несколько сотен байт, которые страница показывает на месте картинки,
+    пока та загружается. Уменьшается сразу в новую маленькую картинку,
+    без полноразмерной копии, и только она поворачивается по EXIF.
+    """
+    scale = min(PLACEHOLDER_SIDE / max(image.size), 1)
+    size = tuple(max(1, round(side * scale)) for side in image.size)
+    small = oriented(image.resize(size, Image.BOX, reducing_gap=2.0))
+    out = BytesIO()
+    small.convert('RGB').save(out, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        out.getvalue()).decode()
+
+
+def file_placeholder(file):
+    """Заглушка для уже сохранённой картинки."""
+    file.seek(0)
+    with Image.open(file) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (PLACEHOLDER_SIDE * 4, PLACEHOLDER_SIDE * 4))
+        return make_placeholder(image)
+
+
+def empty_metadata():
+    return {
+        'image_width': None,
+        'image_height': None,
+        'image_size': None,
+        'image_format': '',
+        'image_hash': '',
+        'image_placeholder': '',
+    }
+
+
+def fill_image_metadata(post):
+    """Записывает в пост метаданные его картинки.
+
+    Заглушку берёт из загрузки, если её посчитала проверка в пуле, а
+    для файлов мимо формы сайта, например из админки, строит сама.
+    """
+    if post.image:
+        metadata = image_metadata(post.image)
+        metadata['image_placeholder'] = getattr(
+            post.image.file, 'placeholder', ''
+        ) or file_placeholder(post.image.file)
+        # Хранилище берёт имя из этого же хэша и не читает файл снова
+        post.image.file.sha256 = metadata['image_hash']
+    else:
+        metadata = empty_metadata()
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+METADATA_FIELDS = tuple(empty_metadata())
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.images import METADATA_FIELDS, fill_image_metadata
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размеры, вес, формат, хэш и заглушки картинок '
+            'постов, сохранённых до появления этих полей, порциями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        pending = Post.objects.exclude(image='').filter(
+            Q(image_hash='') | Q(image_placeholder='')
+        ).order_by('pk').only('pk', 'image')
+        filled = failed = 0
+        last_pk = 0
+        while True:
+            posts = list(pending.filter(pk__gt=last_pk)[:chunk_size])
+            if not posts:
+                break
+            last_pk = posts[-1].pk
+            done = []
+            for post in posts:
+                try:
+                    with post.image.open('rb'):
+                        fill_image_metadata(post)
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'пост {post.pk}: {error}')
+                    continue
+                done.append(post)
+            Post.objects.bulk_update(done, METADATA_FIELDS)
+            filled += len(done)
+        self.stdout.write(f'Заполнено {filled}, не прочитано {failed}')
@@ -0,0 +1,196 @@
+import json
+import math
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Group, Post, User
+from users import urls as users_urls
+
+URLCONFS = (about_urls, posts_urls, users_urls)
+# Маршруты, которые в браузере вызываются не GET без параметров
+REQUESTS = {
+    'posts:add_comment': ('post', {'text': 'Комментарий из бенчмарка'}),
+}
+
+
+def percentile(values, percent):
+    """Значение по методу ближайшего ранга из отсортированного values."""
+    rank = max(math.ceil(len(values) * percent / 100), 1)
+    return values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет каждый маршрут posts, users и about и сохраняет '
+            'p50/p95/p99 задержки, запросы к базе и размер ответа в JSON; '
+            'с --baseline сравнивает с прошлым прогоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Замеров на маршрут.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--routes', nargs='+',
+                            help='Только эти маршруты, например posts:index.')
+        parser.add_argument('--guest', action='store_true',
+                            help='Без входа на сайт.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--baseline',
+                            help='JSON прошлого прогона для сравнения.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Рост p95, который считается регрессией.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        sample = self.sample()
+        routes = self.routes(sample, options['routes'])
+        client = Client()
+        results = {}
+        for name, (method, url, data) in routes.items():
+            results[name] = self.measure(
+                client, sample['reader'], method, url, data, options)
+            self.report(name, results[name])
+        run = {
+            'meta': {
+                'time': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'guest': options['guest'],
+                'cold': options['cold'],
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+            },
+            'routes': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(run, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['baseline']:
+            regressions = self.compare(results, options['baseline'],
+                                       options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(
+                    f'Регрессии: {", ".join(sorted(regressions))}')
+
+    @staticmethod
+    def sample():
+        """Самые тяжёлые объекты: с ними страницы ближе к худшему случаю."""
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        author = User.objects.order_by(
+            '-stats__followers_count', '-pk').first()
+        reader = User.objects.order_by(
+            '-stats__following_count', '-pk').first()
+        group = Group.objects.order_by('-posts_count', '-pk').first()
+        if None in (post, author, reader, group):
+            raise CommandError('Нет данных: запустите generate_dataset.')
+        # Форма правки открывается только автору поста
+        own_post = Post.objects.filter(author=reader).order_by('-pk').first()
+        return {
+            'post_id': post.pk,
+            'own_post_id': own_post.pk if own_post else post.pk,
+            'username': author.username,
+            'slug': group.slug,
+            'uidb64': urlsafe_base64_encode(force_bytes(reader.pk)),
+            'token': default_token_generator.make_token(reader),
+            'q': post.text.split()[0],
+            'reader': reader,
+        }
+
+    @staticmethod
+    def routes(sample, only=None):
+        routes = {}
+        for urlconf in URLCONFS:
+            for pattern in urlconf.urlpatterns:
+                name = f'{urlconf.app_name}:{pattern.name}'
+                if only and name not in only:
+                    continue
+                kwargs = {key: sample[key]
+                          for key in pattern.pattern.converters}
+                if name == 'posts:post_edit':
+                    kwargs['post_id'] = sample['own_post_id']
+                method, data = REQUESTS.get(name, ('get', {}))
+                if name == 'posts:search':
+                    data = {'q': sample['q']}
+                routes[name] = (method, reverse(name, kwargs=kwargs), data)
+        return routes
+
+    def measure(self, client, reader, method, url, data, options):
+        timings, queries, sizes, statuses = [], [], [], set()
+        for number in range(options['warmup'] + options['requests']):
+            if not options['guest']:
+                client.force_login(reader)
+            if options['cold']:
+                cache.clear()
+            # Записи бенчмарка не остаются в базе
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data)
+                    size = sum(map(len, response.streaming_content)) if (
+                        response.streaming) else len(response.content)
+                    elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            if number < options['warmup']:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+            sizes.append(size)
+            statuses.add(response.status_code)
+        timings.sort()
+        return {
+            'url': url,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': max(queries),
+            'bytes': int(statistics.median(sizes)),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:40} {result["status"]} '
+            f'p50 {result["p50_ms"]:8.2f} p95 {result["p95_ms"]:8.2f} '
+            f'p99 {result["p99_ms"]:8.2f} мс, '
+            f'{result["queries"]} запросов, {result["bytes"]} байт'
+        )
+
+    def compare(self, results, path, threshold):
+        """Печатает изменения против baseline, возвращает регрессии."""
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)['routes']
+        regressions = set()
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                self.stdout.write(f'{name}: нет в baseline')
+                continue
+            ratio = result['p95_ms'] / before['p95_ms'] - 1 if (
+                before['p95_ms']) else 0
+            queries = result['queries'] - before['queries']
+            size = result['bytes'] - before['bytes']
+            worse = ratio > threshold or queries > 0
+            if worse:
+                regressions.add(name)
+            self.stdout.write(
+                f'{name:40} p95 {ratio:+.0%}, запросов {queries:+d}, '
+                f'байт {size:+d}{"  РЕГРЕССИЯ" if worse else ""}'
+            )
+        return regressions
@@ -0,0 +1,56 @@
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import walk
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Не трогать файлы моложе этого: пост с только что '
+                 'загруженной картинкой мог ещё не сохраниться.',
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        deadline = time.time() - options['grace_hours'] * 3600
+        root = field.upload_to.rstrip('/')
+        files = walk(storage, root) if storage.exists(root) else iter(())
+        checked = removed = 0
+        while True:
+            chunk = list(islice(files, options['chunk_size']))
+            if not chunk:
+                break
+            checked += len(chunk)
+            references = dict(
+                Post.objects.filter(image__in=chunk).order_by()
+                .values('image')
+                .annotate(references=Count('pk'))
+                .values_list('image', 'references')
+            )
+            for name in chunk:
+                if references.get(name):
+                    continue
+                modified = storage.get_modified_time(name).timestamp()
+                if modified > deadline:
+                    continue
+                removed += 1
+                self.stdout.write(f'сирота: {name}')
+                if not options['dry_run']:
+                    default.kvstore.delete(ImageFile(name, storage))
+                    storage.delete(name)
+        action = 'найдено' if options['dry_run'] else 'удалено'
+        self.stdout.write(f'Проверено {checked}, {action} {removed}')
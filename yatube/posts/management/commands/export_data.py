@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.bulk_export import EXPORTS, FORMATS, export_stream
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает посты или комментарии в NDJSON или CSV, '
+            'порциями по id, с gzip по желанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='ndjson')
+        parser.add_argument('--output', default='-',
+                            help='Файл или - для stdout.')
+        parser.add_argument('--gzip', action='store_true')
+
+    def handle(self, *args, **options):
+        chunks = export_stream(options['model'], options['format'],
+                               options['gzip'])
+        if options['output'] == '-':
+            self.write(sys.stdout.buffer, chunks)
+        else:
+            with open(options['output'], 'wb') as output:
+                written = self.write(output, chunks)
+            self.stderr.write(f'Записано {written} байт')
+
+    @staticmethod
+    def write(output, chunks):
+        written = 0
+        for chunk in chunks:
+            output.write(chunk)
+            written += len(chunk)
+        output.flush()
+        return written
@@ -0,0 +1,52 @@
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = ('Распределение подписчиков по авторам и цена раскладки '
+            'ленты при разных порогах FEED_CELEBRITY_FOLLOWERS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--thresholds', nargs='+', type=int,
+            default=[100, 1000, 10000, 100000],
+            help='Пороги подписчиков, для которых считать цену.',
+        )
+
+    def handle(self, *args, **options):
+        counts = sorted(
+            Follow.objects.values('author_id')
+            .annotate(followers=Count('id'))
+            .values_list('followers', flat=True)
+            .iterator()
+        )
+        if not counts:
+            self.stdout.write('Подписок нет.')
+            return
+        total = sum(counts)
+        self.stdout.write(f'Авторов с подписчиками: {len(counts)}, '
+                          f'подписок: {total}')
+        for percentile in (50, 90, 99):
+            index = min(len(counts) - 1, len(counts) * percentile // 100)
+            self.stdout.write(f'p{percentile}: {counts[index]}')
+        self.stdout.write(f'max: {counts[-1]}')
+        thresholds = sorted(
+            set(options['thresholds']) | {settings.FEED_CELEBRITY_FOLLOWERS}
+        )
+        for threshold in thresholds:
+            split = bisect_left(counts, threshold)
+            pushed = sum(counts[:split])
+            marker = (' (текущий)'
+                      if threshold == settings.FEED_CELEBRITY_FOLLOWERS
+                      else '')
+            self.stdout.write(
+                f'порог {threshold}{marker}: '
+                f'pull-авторов {len(counts) - split}, '
+                f'push-строк на пост каждого автора {pushed}, '
+                f'подписок через pull {total - pushed}'
+            )
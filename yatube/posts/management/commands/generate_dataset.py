@@ -0,0 +1,214 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from posts.bulk_import import loader
+from posts.images import image_metadata, make_placeholder
+from posts.models import Comment, Follow, Group, Post, User
+
+SCALES = {
+    'small': {'users': 200, 'groups': 10, 'posts': 2000, 'comments': 5000},
+    'medium': {'users': 2000, 'groups': 50, 'posts': 50000,
+               'comments': 100000},
+    'large': {'users': 20000, 'groups': 200, 'posts': 1000000,
+              'comments': 2000000},
+}
+WORDS = (
+    'кот пёс утро вечер город море лес река дом сад книга кофе чай '
+    'дорога поезд снег дождь солнце ветер музыка кино друг работа '
+    'отпуск горы озеро парк школа весна лето осень зима праздник '
+    'ужин завтрак мост улица окно небо звезда песня картина фото'
+).split()
+FIRST_NAMES = ('Анна', 'Лев', 'Мария', 'Иван', 'Ольга', 'Пётр', 'Вера')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов')
+
+
+def power_law(rng, population, alpha):
+    """Выбор k элементов population с весом 1/ранг^alpha, с повторами."""
+    cum_weights = list(accumulate(
+        1 / rank ** alpha for rank in range(1, len(population) + 1)))
+
+    def sample(k):
+        return rng.choices(population, cum_weights=cum_weights, k=k)
+    return sample
+
+
+def batched(objs, size):
+    objs = iter(objs)
+    batch = list(islice(objs, size))
+    while batch:
+        yield batch
+        batch = list(islice(objs, size))
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетические данные для бенчмарков: пользователей, '
+            'группы, граф подписок со степенным распределением, посты с '
+            'картинками и без, комментарии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES),
+                            default='small')
+        for name in ('users', 'groups', 'posts', 'comments'):
+            parser.add_argument(f'--{name}', type=int,
+                                help='Вместо значения из --scale.')
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя в среднем.')
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель степенного закона '
+                                 'популярности авторов и постов.')
+        parser.add_argument('--image-share', type=float, default=0.3,
+                            help='Доля постов с картинкой.')
+        parser.add_argument('--image-pool', type=int, default=20,
+                            help='Разных картинок на все посты.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросать даты.')
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--thumbnails', action='store_true',
+                            help='Сразу построить миниатюры.')
+
+    def handle(self, *args, **options):
+        sizes = dict(SCALES[options['scale']])
+        for name in sizes:
+            if options[name] is not None:
+                sizes[name] = options[name]
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        prefix = options['prefix']
+        self.step('user', self.users(sizes['users']))
+        users = list(User.objects.filter(
+            username__startswith=prefix).values_list('pk', flat=True))
+        self.step('group', self.groups(sizes['groups']))
+        groups = list(Group.objects.filter(
+            slug__startswith=prefix).values_list('pk', flat=True))
+        self.step('post', self.posts(sizes['posts'], users, groups))
+        posts = list(Post.objects.filter(
+            author_id__in=users).values_list('pk', flat=True))
+        self.step('comment', self.comments(sizes['comments'], posts, users))
+        self.step('follow', self.follows(users))
+        if options['thumbnails']:
+            call_command('regenerate_thumbnails', workers=0, restart=True,
+                         stdout=self.stdout)
+
+    def step(self, name, objs):
+        """Пишет объекты пакетами через загрузчик import_data."""
+        target = loader(name)
+        started = time.monotonic()
+        written = 0
+        for batch in batched(objs, self.options['batch_size']):
+            with transaction.atomic():
+                written += target.write(batch)
+                target.flush_tags()
+        self.stdout.write(f'{name}: {written} за '
+                          f'{time.monotonic() - started:.1f} с')
+
+    def text(self, mean_words):
+        count = max(1, int(self.rng.lognormvariate(0, 0.8) * mean_words))
+        return ' '.join(self.rng.choices(WORDS, k=count)).capitalize()
+
+    def date(self):
+        return self.now - timedelta(
+            seconds=self.rng.randrange(self.options['days'] * 86400))
+
+    def users(self, count):
+        password = make_password(None)
+        prefix = self.options['prefix']
+        for number in range(count):
+            yield User(
+                username=f'{prefix}{number}',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                password=password,
+            )
+
+    def groups(self, count):
+        for number in range(count):
+            yield Group(
+                slug=f'{self.options["prefix"]}-{number}',
+                title=self.text(2),
+                description=self.text(15),
+            )
+
+    def posts(self, count, users, groups):
+        if not users:
+            return
+        images = self.images()
+        authors = power_law(self.rng, users, self.options['alpha'])
+        for author_id in authors(count):
+            post = Post(
+                text=self.text(40),
+                author_id=author_id,
+                group_id=(self.rng.choice(groups)
+                          if groups and self.rng.random() < 0.5 else None),
+                pub_date=self.date(),
+            )
+            if images and self.rng.random() < self.options['image_share']:
+                name, metadata = self.rng.choice(images)
+                post.image = name
+                for field, value in metadata.items():
+                    setattr(post, field, value)
+            yield post
+
+    def images(self):
+        """Несколько JPEG в хранилище постов с посчитанными метаданными."""
+        if not self.options['image_share']:
+            return []
+        storage = Post._meta.get_field('image').storage
+        images = []
+        for number in range(self.options['image_pool']):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            image = Image.new('RGB', (1200, 800), color)
+            draw = ImageDraw.Draw(image)
+            for _ in range(20):
+                box = sorted(self.rng.sample(range(1200), 2))
+                box += sorted(self.rng.sample(range(800), 2))
+                draw.rectangle((box[0], box[2], box[1], box[3]), fill=tuple(
+                    self.rng.randrange(256) for _ in range(3)))
+            out = BytesIO()
+            image.save(out, 'JPEG', quality=85)
+            file = ContentFile(out.getvalue())
+            metadata = image_metadata(file)
+            metadata['image_placeholder'] = make_placeholder(image)
+            images.append(
+                (storage.save(f'posts/{number}.jpg', file), metadata))
+        return images
+
+    def comments(self, count, posts, users):
+        if not posts:
+            return
+        picked = power_law(self.rng, posts, self.options['alpha'])
+        for post_id in picked(count):
+            yield Comment(
+                post_id=post_id,
+                author_id=self.rng.choice(users),
+                text=self.text(12),
+                created=self.date(),
+            )
+
+    def follows(self, users):
+        """Подписки: сколько — по Парето, на кого — по популярности."""
+        if len(users) < 2:
+            return
+        alpha = 2
+        mean = self.options['follows'] * (alpha - 1) / alpha
+        popular = power_law(self.rng, users, self.options['alpha'])
+        for user_id in users:
+            count = min(len(users) - 1,
+                        int(mean * self.rng.paretovariate(alpha)))
+            authors = set(popular(count))
+            authors.discard(user_id)
+            for author_id in authors:
+                yield Follow(user_id=user_id, author_id=author_id)
@@ -0,0 +1,109 @@
+import io
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from posts.bulk_import import LOADERS, READERS, RowError, loader
+
+
+class Command(BaseCommand):
+    help = ('Потоково импортирует пользователей, группы, посты, '
+            'комментарии или подписки из NDJSON или CSV пакетами '
+            'bulk_create, не читая файл целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(LOADERS))
+        parser.add_argument('path', help='Файл или - для stdin.')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='По умолчанию — по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк в одном bulk_create.')
+        parser.add_argument('--chunk-size', type=int, default=20000,
+                            help='Строк в одной транзакции.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS[options['format'] or self.guess_format(path)]
+        target = loader(options['model'])
+        batch_size = options['batch_size']
+        batches_per_chunk = max(options['chunk_size'] // batch_size, 1)
+        with self.open_input(path) as file:
+            rows = self.numbered(reader(file))
+            batches = iter(lambda: list(islice(rows, batch_size)), [])
+            started = time.monotonic()
+            read = written = 0
+            while True:
+                chunk = list(islice(batches, batches_per_chunk))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    for batch in chunk:
+                        read += len(batch)
+                        written += self.write(target, batch)
+                    target.flush_tags()
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'прочитано {read}, записано {written}, '
+                    f'{read / elapsed if elapsed else 0:.0f} строк/с'
+                )
+        self.reset_sequence(target.model)
+        self.stdout.write(
+            f'Импортировано {written} из {read}, '
+            f'пропущено {read - written}'
+        )
+
+    @staticmethod
+    def guess_format(path):
+        extension = os.path.splitext(path)[1].lower()
+        formats = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+        if extension not in formats:
+            raise CommandError('Укажите --format: расширение не распознано.')
+        return formats[extension]
+
+    @staticmethod
+    def open_input(path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        return open(path, encoding='utf-8', newline='')
+
+    @staticmethod
+    def numbered(rows):
+        yield from enumerate(rows, start=1)
+
+    def build(self, target, batch):
+        """Объекты порции и номера их строк в файле."""
+        objs, numbers = [], {}
+        for number, row in batch:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                if not isinstance(row, dict):
+                    raise RowError('ожидался объект')
+                obj = target.build(row)
+            except RowError as error:
+                self.stderr.write(f'строка {number}: {error}')
+                continue
+            objs.append(obj)
+            numbers[id(obj)] = number
+        return objs, numbers
+
+    def write(self, target, batch):
+        objs, numbers = self.build(target, batch)
+        written = target.write(objs)
+        for obj, reason in target.rejected:
+            self.stderr.write(f'строка {numbers[id(obj)]}: {reason}')
+        target.rejected.clear()
+        return written
+
+    @staticmethod
+    def reset_sequence(model):
+        # id из файла не двигают последовательность на PostgreSQL
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,103 @@
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+MAX_WIDTH = re.compile(r'\(max-width:\s*(\d+)px\)')
+
+
+class ImageCollector(HTMLParser):
+    """Собирает <img> страницы вместе с <source> их <picture>."""
+
+    def __init__(self):
+        super().__init__()
+        self.images = []
+        self.source = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'source':
+            self.source = attrs
+        elif tag == 'img' and attrs.get('src'):
+            self.images.append((attrs['src'], self.source))
+
+    def handle_endtag(self, tag):
+        if tag == 'picture':
+            self.source = None
+
+
+def slot_width(sizes, viewport):
+    """Ширина слота картинки из атрибута sizes для данного экрана."""
+    for entry in sizes.split(','):
+        condition, _, length = entry.strip().rpartition(' ')
+        match = MAX_WIDTH.fullmatch(condition.strip())
+        if condition and not (match and viewport <= int(match[1])):
+            continue
+        if length.endswith('vw'):
+            return viewport * float(length[:-2]) / 100
+        if length.endswith('px'):
+            return float(length[:-2])
+    return viewport
+
+
+def pick_candidate(source, viewport, dpr):
+    """URL из srcset, который выберет браузер, как это делает Chrome."""
+    candidates = sorted(
+        (int(width.rstrip('w')), url)
+        for url, width in (
+            candidate.split() for candidate in source['srcset'].split(',')
+        )
+    )
+    needed = slot_width(source.get('sizes', ''), viewport) * dpr
+    for width, url in candidates:
+        if width >= needed:
+            return url
+    return candidates[-1][1]
+
+
+def file_size(url):
+    if not url.startswith(settings.MEDIA_URL):
+        return 0
+    name = url[len(settings.MEDIA_URL):]
+    if not default_storage.exists(name):
+        return 0
+    return default_storage.size(name)
+
+
+class Command(BaseCommand):
+    help = ('Вес страницы с картинками: одна миниатюра из src против '
+            'варианта из srcset, который выберет браузер.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?', default='/')
+        parser.add_argument('--viewports', nargs='+', type=int,
+                            default=[360, 768, 1280],
+                            help='Ширины экрана в CSS-пикселях.')
+        parser.add_argument('--dpr', type=float, default=2,
+                            help='Плотность пикселей экрана.')
+
+    def handle(self, *args, **options):
+        response = Client().get(options['url'])
+        if response.status_code != 200:
+            raise CommandError(
+                f'{options["url"]}: ответ {response.status_code}')
+        collector = ImageCollector()
+        collector.feed(response.content.decode())
+        html = len(response.content)
+        self.stdout.write(f'{options["url"]}: HTML {html} Б, '
+                          f'картинок {len(collector.images)}')
+        before = html + sum(file_size(src) for src, _ in collector.images)
+        for viewport in options['viewports']:
+            after = html + sum(
+                file_size(pick_candidate(source, viewport, options['dpr'])
+                          if source else src)
+                for src, source in collector.images
+            )
+            saved = 100 - after * 100 // before if before else 0
+            self.stdout.write(
+                f'экран {viewport}px, dpr {options["dpr"]:g}: '
+                f'до {before} Б, после {after} Б (-{saved}%)'
+            )
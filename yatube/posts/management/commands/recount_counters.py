@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import COUNTERS, recount_chunk
+from posts.models import User, UserStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'порциями и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        self.create_missing_stats(chunk_size)
+        for model, fields in COUNTERS:
+            checked = fixed = 0
+            last_pk = None
+            while True:
+                queryset = model.objects.order_by('pk')
+                if last_pk is not None:
+                    queryset = queryset.filter(pk__gt=last_pk)
+                pks = list(queryset.values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                fixed += recount_chunk(model, fields, pks)
+                checked += len(pks)
+                last_pk = pks[-1]
+            self.stdout.write(
+                f'{model._meta.label}: проверено {checked}, '
+                f'исправлено {fixed}'
+            )
+
+    def create_missing_stats(self, chunk_size):
+        missing = User.objects.filter(stats__isnull=True).values_list(
+            'pk', flat=True)
+        while True:
+            pks = list(missing[:chunk_size])
+            if not pks:
+                break
+            UserStats.objects.bulk_create(
+                [UserStats(user_id=pk) for pk in pks],
+                ignore_conflicts=True,
+            )
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+from collections import deque
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.regenerate import regenerate_batch, setup_worker
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры из POST_THUMBNAILS и их варианты для всех '
+            'постов с картинками в пуле процессов, с продолжением после '
+            'остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Процессов; 0 — в текущем процессе.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--state-file', default='regenerate_thumbnails.json',
+            help='Куда записывать последний обработанный id поста.',
+        )
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать с первого поста.')
+
+    def handle(self, *args, **options):
+        state_file = options['state_file']
+        last_pk = 0 if options['restart'] else self.load_state(state_file)
+        pending = Post.objects.exclude(image='').filter(pk__gt=last_pk)
+        total = pending.count()
+        self.stdout.write(f'Постов с картинками после id {last_pk}: {total}')
+        batches = self.batches(pending, options['batch_size'])
+        started = time.monotonic()
+        done = ready = 0
+        for pks, batch_ready in self.run(batches, options['workers']):
+            done += len(pks)
+            ready += batch_ready
+            self.save_state(state_file, pks[-1])
+            elapsed = time.monotonic() - started
+            rate = done / elapsed if elapsed else 0
+            left = (total - done) / rate if rate else 0
+            self.stdout.write(
+                f'{done}/{total}, готово {ready}, '
+                f'{rate:.1f} постов/с, осталось ~{left:.0f} с'
+            )
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        self.stdout.write(f'Обработано {done} постов, готово {ready}')
+
+    @staticmethod
+    def batches(queryset, batch_size):
+        """id постов порциями по возрастанию, без загрузки всей выборки."""
+        last_pk = 0
+        while True:
+            pks = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                return
+            last_pk = pks[-1]
+            yield pks
+
+    @staticmethod
+    def run(batches, workers):
+        """(id порции, готово) в порядке порций.
+
+        В пуле одновременно не больше двух порций на процесс, поэтому
+        следующая порция читается из базы, только когда есть место.
+        """
+        if not workers:
+            for pks in batches:
+                yield pks, regenerate_batch(pks)
+            return
+        with get_context('spawn').Pool(workers, setup_worker) as pool:
+            window = deque()
+            for pks in batches:
+                window.append(
+                    (pks, pool.apply_async(regenerate_batch, (pks,))))
+                if len(window) >= workers * 2:
+                    pks, result = window.popleft()
+                    yield pks, result.get()
+            while window:
+                pks, result = window.popleft()
+                yield pks, result.get()
+
+    @staticmethod
+    def load_state(path):
+        if not os.path.exists(path):
+            return 0
+        with open(path) as state:
+            return json.load(state)['last_pk']
+
+    @staticmethod
+    def save_state(path, last_pk):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as state:
+            json.dump({'last_pk': last_pk}, state)
+        os.replace(temporary, path)
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from posts.search import ensure_index
+    ensure_index(schema_editor.connection, rebuild=True)
+
+
+def drop_index(apps, schema_editor):
+    from posts.search import drop_index
+    drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
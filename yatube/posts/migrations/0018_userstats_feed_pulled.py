@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_comment_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_pulled',
+            field=models.BooleanField(default=False, help_text='Автор был популярным: его посты не раскладывались в ленты, поэтому их дочитывают и ниже порога подписчиков.', verbose_name='Посты дочитываются в ленты при чтении'),
+        ),
+    ]
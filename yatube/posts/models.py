@@ -1,19 +1,34 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
 
+class AtomicSaveModel(models.Model):
+    """Запись и обработчики post_save выполняются в одной транзакции."""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
 class Group(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     slug = models.SlugField('ID', unique=True, default='title')
     description = models.TextField('Описание')
+    posts_count = models.PositiveIntegerField('Постов', default=0,
+                                              editable=False)
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class Post(AtomicSaveModel):
     text = models.TextField('Текст', help_text='Введите текст поста')
     pub_date = models.DateTimeField('Дата добавления',
                                     auto_now_add=True,
@@ -36,19 +51,107 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_width = models.PositiveIntegerField('Ширина картинки', null=True,
+                                              editable=False)
+    image_height = models.PositiveIntegerField('Высота картинки', null=True,
+                                               editable=False)
+    image_size = models.PositiveIntegerField('Размер картинки, байт',
+                                             null=True, editable=False)
+    image_format = models.CharField('Формат картинки', max_length=10,
+                                    blank=True, editable=False)
+    image_hash = models.CharField('sha256 картинки', max_length=64,
+                                  blank=True, editable=False)
+    image_placeholder = models.TextField('Заглушка картинки', blank=True,
+                                         editable=False)
+    comments_count = models.PositiveIntegerField('Комментариев', default=0,
+                                                 editable=False)
+    thumbnails_ready = models.BooleanField('Миниатюры готовы', default=False,
+                                           editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['pub_date', 'id'],
+                         name='post_pub_date_id'),
+            models.Index(fields=['group', 'pub_date', 'id'],
+                         name='post_group_pub_date_id'),
+            models.Index(fields=['author', 'pub_date', 'id'],
+                         name='post_author_pub_date_id'),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # Сигналы счётчиков сравнивают группу с загруженной без SELECT
+        post.loaded_group_id = post.__dict__.get('group_id', models.DEFERRED)
+        post.loaded_image = post.__dict__.get('image', models.DEFERRED)
+        return post
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.loaded_group_id = self.__dict__.get('group_id', models.DEFERRED)
+        self.loaded_image = self.__dict__.get('image', models.DEFERRED)
+
+
+class ImageVariant(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants'
+    )
+    name = models.CharField('Назначение', max_length=20)
+    file = models.CharField('Файл', max_length=255)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+    size = models.PositiveIntegerField('Размер, байт')
+
+    class Meta:
+        ordering = ('width',)
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'name', 'width'],
+                                    name='one_image_variant'),
+        ]
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+
+    def __str__(self):
+        return f'{self.name} {self.width}w: {self.post_id}'
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    feed_pulled = models.BooleanField(
+        'Посты дочитываются в ленты при чтении',
+        default=False,
+        help_text='Автор был популярным: его посты не раскладывались в '
+                  'ленты, поэтому их дочитывают и ниже порога подписчиков.'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'stats: {self.user_id}'
+
 
-class Comment(models.Model):
+class Comment(AtomicSaveModel):
     objects = None
     post = models.ForeignKey(
         Post,
@@ -65,9 +168,13 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_id'),
+        ]
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveModel):
     objects = None
     user = models.ForeignKey(
         User,
@@ -90,3 +197,38 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'follower: {self.user} author: {self.author}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField('Дата добавления')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timeline_user_pub_date'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='one_timeline_entry'),
+        ]
+
+    def __str__(self):
+        return f'timeline: {self.user} post: {self.post_id}'
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# Границы 64-битного целого: id вне них база не примет
+MIN_PK, MAX_PK = -2 ** 63, 2 ** 63 - 1
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (дата, id) без COUNT и OFFSET.
+
+    Соседняя страница выбирается условием по ключу крайней записи текущей,
+    поэтому стоимость страницы не зависит от того, насколько она глубоко.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date',
+                 tiebreaker='pk'):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.tiebreaker = tiebreaker
+        self.has_next = False
+        self.has_previous = False
+
+    @property
+    def num_pages(self):
+        return self.number + self.has_next
+
+    @property
+    def number(self):
+        return 1 + self.has_previous
+
+    def encode_cursor(self, obj):
+        payload = json.dumps([
+            getattr(obj, self.key).isoformat(),
+            getattr(obj, self.tiebreaker),
+        ])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """(значение ключа, id) из токена или None для первой страницы.
+
+        Подделанный токен не должен дойти до базы: id вне 64 бит даёт
+        OverflowError, а дата без часового пояса — предупреждение.
+        """
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(padded))
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (binascii.Error, TypeError, ValueError):
+            return None
+        if value is None or not MIN_PK <= pk <= MAX_PK:
+            return None
+        if settings.USE_TZ and timezone.is_naive(value):
+            return None
+        return value, pk
+
+    def seek(self, cursor, lookup, tiebreaker):
+        value, pk = cursor
+        return (Q(**{f'{self.key}__{lookup}': value})
+                | Q(**{self.key: value, f'{tiebreaker}__{lookup}': pk}))
+
+    def order(self, queryset, cursor, forward, tiebreaker=None):
+        tiebreaker = tiebreaker or self.tiebreaker
+        lookup, sign = ('lt', '-') if forward else ('gt', '')
+        if cursor is not None:
+            queryset = queryset.filter(self.seek(cursor, lookup, tiebreaker))
+        return queryset.order_by(f'{sign}{self.key}', f'{sign}{tiebreaker}')
+
+    def fetch(self, cursor, forward):
+        queryset = self.order(self.object_list, cursor, forward)
+        return list(queryset[:self.per_page + 1])
+
+    def get_page(self, after=None, before=None):
+        after = self.decode_cursor(after)
+        before = self.decode_cursor(before)
+        if before is not None:
+            rows = self.fetch(before, forward=False)
+            self.has_previous = len(rows) > self.per_page
+            if not self.has_previous:
+                return self.get_page()
+            self.has_next = True
+            rows = rows[:self.per_page][::-1]
+        else:
+            rows = self.fetch(after, forward=True)
+            self.has_next = len(rows) > self.per_page
+            self.has_previous = after is not None
+            rows = rows[:self.per_page]
+        return self.build_page(rows)
+
+    def build_page(self, rows):
+        page = Page(rows, self.number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and self.has_next:
+            page.next_cursor = self.encode_cursor(rows[-1])
+        if rows and self.has_previous:
+            page.previous_cursor = self.encode_cursor(rows[0])
+        return page
+
+
+def paginate(request, queryset, per_page=settings.NUM_OF_POSTS, **kwargs):
+    paginator = CursorPaginator(queryset, per_page, **kwargs)
+    return paginator.get_page(
+        request.GET.get('after'),
+        request.GET.get('before'),
+    )
@@ -0,0 +1,11 @@
+"""Плагин pytest: миниатюры строятся сразу, в потоке теста.
+
+Подключается через pytest_plugins. Задачи пула переживали бы тест и
+писали бы в каталог MEDIA_ROOT, который фикстура уже удалила.
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings):
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,15 @@
+"""Задачи пула regenerate_thumbnails.
+
+Модуль импортируется в новых процессах до django.setup(), поэтому
+модели и всё, что их тянет, импортируются внутри функций.
+"""
+
+
+def setup_worker():
+    import django
+    django.setup()
+
+
+def regenerate_batch(pks):
+    from .thumbnails import generate_thumbnails
+    return sum(generate_thumbnails(pk) for pk in pks)
@@ -0,0 +1,145 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+
+# Внешний индекс: текст хранится только в posts_post, FTS5 держит
+# лишь инвертированный индекс. Триггеры видят и bulk_create, и update().
+SCHEMA = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {TABLE}({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+)
+DROP = (
+    f'DROP TRIGGER IF EXISTS {TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {TABLE}_update',
+    f'DROP TABLE IF EXISTS {TABLE}',
+)
+
+
+def supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def ensure_index(using, rebuild=False):
+    """Создаёт индекс и триггеры, если их нет.
+
+    SQLite пересоздаёт таблицу при изменении её схемы в миграциях и
+    теряет триггеры, поэтому это вызывается и после каждого migrate.
+    """
+    if not supported(using):
+        return
+    if 'posts_post' not in using.introspection.table_names():
+        return
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE %s", [f'{TABLE}_%'])
+        intact = cursor.fetchone()[0] == len(SCHEMA) - 1
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        if rebuild or not intact:
+            cursor.execute(
+                f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(using):
+    if supported(using):
+        with using.cursor() as cursor:
+            for statement in DROP:
+                cursor.execute(statement)
+
+
+def match_expression(query):
+    """Запрос пользователя в виде выражения MATCH.
+
+    Ищутся все слова, последнее — как префикс. Операторы FTS5 из ввода
+    до индекса не доходят.
+    """
+    words = WORD.findall(query.lower())
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_ids(match):
+    return RawSQL(f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+                  [match])
+
+
+class SearchResults:
+    """Посты по запросу в порядке bm25, в форме, понятной Paginator."""
+
+    def __init__(self, match, queryset):
+        self.match = match
+        self.queryset = queryset
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT count(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                    [self.match])
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        start = index.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s '
+                f'ORDER BY bm25({TABLE}) LIMIT %s OFFSET %s',
+                [self.match, index.stop - start, start])
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(queryset, query):
+    """Посты, подходящие под запрос, для Paginator.
+
+    На SQLite — через индекс FTS5 по релевантности, на других базах —
+    через icontains по дате.
+    """
+    if not supported():
+        return queryset.filter(text__icontains=query) if query else []
+    match = match_expression(query)
+    if not match:
+        return []
+    return SearchResults(match, queryset)
+
+
+def filter_posts(queryset, query):
+    """queryset, суженный до постов, подходящих под запрос."""
+    if not supported():
+        return queryset.filter(text__icontains=query)
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=matching_ids(match))
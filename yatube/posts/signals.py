@@ -0,0 +1,150 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import DEFERRED
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from core.cache import invalidate_tags
+
+from . import cache_tags, counters, search, timeline
+from .images import empty_metadata, fill_image_metadata
+from .models import Comment, Follow, Group, ImageVariant, Post, UserStats
+from .thumbnails import enqueue_thumbnails
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    if sender.label == 'posts':
+        search.ensure_index(connections[using])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance.saved_group_id = None
+    if instance.pk is None:
+        return
+    loaded = getattr(instance, 'loaded_group_id', DEFERRED)
+    if loaded is not DEFERRED:
+        instance.saved_group_id = loaded
+        return
+    instance.saved_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def remember_image(sender, instance, raw, update_fields, **kwargs):
+    """Отмечает смену картинки поста, откуда бы ни пришло сохранение."""
+    instance.image_changed = False
+    if raw:
+        return
+    if instance.pk is None:
+        instance.image_changed = bool(instance.image)
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image and not instance.image._committed:
+        instance.image_changed = True
+        return
+    loaded = getattr(instance, 'loaded_image', DEFERRED)
+    if loaded is DEFERRED:
+        loaded = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first()
+    instance.image_changed = (instance.image.name or '') != (loaded or '')
+
+
+@receiver(pre_save, sender=Post)
+def store_image_metadata(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    # Новая картинка ещё не в хранилище и читается из загруженного файла
+    if not instance.image or not instance.image._committed:
+        fill_image_metadata(instance)
+    elif instance.image_changed:
+        # Чужое имя из хранилища: метаданные допишет генерация миниатюр
+        for field, value in empty_metadata().items():
+            setattr(instance, field, value)
+    if instance.image_changed:
+        instance.thumbnails_ready = False
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.count_post(instance, 1)
+        timeline.fan_out(instance)
+    else:
+        counters.move_post(instance, instance.saved_group_id)
+    if instance.image_changed:
+        if not created:
+            ImageVariant.objects.filter(post=instance).delete()
+        enqueue_thumbnails(instance)
+    instance.loaded_group_id = instance.group_id
+    instance.loaded_image = instance.image.name
+    invalidate_tags(*cache_tags.post_changed_tags(
+        instance, instance.group_id, instance.saved_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.count_post(instance, -1)
+    invalidate_tags(*cache_tags.post_changed_tags(
+        instance, instance.group_id))
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance.saved_slug = None
+    if instance.pk is not None:
+        instance.saved_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    slugs = [instance.saved_slug] if instance.saved_slug else []
+    invalidate_tags(*cache_tags.group_changed_tags(instance, *slugs))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    invalidate_tags(*cache_tags.group_changed_tags(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.count_comment(instance, 1)
+    invalidate_tags(cache_tags.post_tag(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.count_comment(instance, -1)
+    invalidate_tags(cache_tags.post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.count_follow(instance, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+    invalidate_tags(cache_tags.follow_tag(instance.user_id,
+                                          instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.count_follow(instance, -1)
+    timeline.trim(instance.user_id, instance.author_id)
+    invalidate_tags(cache_tags.follow_tag(instance.user_id,
+                                          instance.author_id))
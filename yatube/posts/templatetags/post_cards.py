@@ -0,0 +1,65 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from ..thumbnails import make_srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, name):
+    """Готовая миниатюра из POST_THUMBNAILS или None, пока её строят.
+
+    Берёт миниатюру из ThumbnailBatch страницы, если view его собрал.
+    """
+    if not post.image or not post.thumbnails_ready:
+        return None
+    batch = getattr(post, 'thumbnail_batch', None)
+    thumbnail = batch.get(post, name) if batch is not None else None
+    if thumbnail is not None:
+        return thumbnail
+    geometry, options = settings.POST_THUMBNAILS[name]
+    return get_thumbnail(post.image, geometry, **options)
+
+
+@register.simple_tag
+def post_srcset(post, name):
+    """srcset и sizes вариантов миниатюры name или None, пока их нет."""
+    if not post.image or not post.thumbnails_ready:
+        return None
+    batch = getattr(post, 'thumbnail_batch', None)
+    if batch is not None:
+        variants = batch.get_variants(post, name)
+    else:
+        variants = list(post.image_variants.filter(name=name))
+    return make_srcset(variants, name)
+
+
+@register.filter
+def card_version(post):
+    """Версия карточки поста: меняется вместе с постом, автором и группой.
+
+    Считается по уже загруженным полям, поэтому кэш карточки не нужно
+    сбрасывать вручную, а старые версии просто вытесняются по таймауту.
+    Смена геометрии миниатюр в настройках тоже меняет версию.
+    """
+    group = post.group
+    author = post.author
+    parts = (
+        post.text,
+        post.pub_date.isoformat(),
+        post.image.name or '',
+        str(post.thumbnails_ready),
+        str(post.image_width),
+        post.image_placeholder,
+        author.username,
+        author.first_name,
+        author.last_name,
+        group.slug if group else '',
+        repr(settings.POST_THUMBNAILS),
+        repr(settings.POST_IMAGE_VARIANTS),
+    )
+    return hashlib.md5('\x00'.join(parts).encode()).hexdigest()
@@ -0,0 +1,116 @@
+from itertools import cycle, islice
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+BATCH_SIZE = 1000
+
+
+class QueryBudgetMixin:
+    """Ограничивает число запросов каждой страницы ``posts.urls``.
+
+    Наследник задаёт ``posts_count`` — объём данных, и ``budgets`` —
+    {имя маршрута: лимит запросов}. Лимиты одни и те же для любого
+    объёма: если число запросов растёт вместе с данными, тест падает.
+    """
+
+    posts_count = 10
+    authors_count = 10
+    budgets = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(username=f'author-{i}')
+            for i in range(cls.authors_count)
+        ]
+        cls.reader = cls.authors[0]
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for author in cls.authors[1:]:
+            Follow.objects.create(user=cls.reader, author=author)
+        posts = (
+            Post(text=f'Пост {i}', author=author, group=cls.group)
+            for i, author in zip(range(cls.posts_count), cycle(cls.authors))
+        )
+        cls.bulk_create(Post, posts)
+        cls.bulk_create(TimelineEntry, (
+            TimelineEntry(user=cls.reader, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, author_id, pub_date in Post.objects.exclude(
+                author=cls.reader
+            ).values_list('id', 'author_id', 'pub_date').iterator()
+        ))
+        cls.post = Post.objects.filter(author=cls.reader).latest('pk')
+        cls.bulk_create(Comment, (
+            Comment(post=cls.post, author=author, text='Комментарий')
+            for author in islice(cycle(cls.authors), cls.posts_count // 10)
+        ))
+
+    @staticmethod
+    def bulk_create(model, objs):
+        objs = iter(objs)
+        batch = list(islice(objs, BATCH_SIZE))
+        while batch:
+            model.objects.bulk_create(batch)
+            batch = list(islice(objs, BATCH_SIZE))
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def requests(self):
+        post = {'post_id': self.post.pk}
+        return {
+            'index': ('get', reverse('posts:index'), {}),
+            'group_list': ('get', reverse(
+                'posts:group_list', args=[self.group.slug]), {}),
+            'profile': ('get', reverse(
+                'posts:profile', args=[self.reader.username]), {}),
+            'post_detail': ('get', reverse(
+                'posts:post_detail', kwargs=post), {}),
+            'post_comments': ('get', reverse(
+                'posts:post_comments', kwargs=post), {}),
+            'post_create': ('get', reverse('posts:post_create'), {}),
+            'post_edit': ('get', reverse('posts:post_edit', kwargs=post), {}),
+            'add_comment': ('post', reverse(
+                'posts:add_comment', kwargs=post), {'text': 'Ещё один'}),
+            'follow_index': ('get', reverse('posts:follow_index'), {}),
+            'search': ('get', reverse('posts:search'), {'q': 'пост'}),
+            'profile_follow': ('get', reverse(
+                'posts:profile_follow', args=[self.stranger.username]), {}),
+            'profile_unfollow': ('get', reverse(
+                'posts:profile_unfollow', args=[self.authors[1].username]),
+                {}),
+        }
+
+    def test_budgets_cover_all_urls(self):
+        """Лимит задан для каждого маршрута posts.urls."""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(set(self.budgets), names)
+        self.assertEqual(set(self.requests()), names)
+
+    def test_query_budgets(self):
+        """Страницы укладываются в лимит запросов."""
+        for name, (method, url, data) in self.requests().items():
+            with self.subTest(name=name, posts=self.posts_count):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(self.client, method)(url, data)
+                self.assertLess(response.status_code, 400)
+                executed = [query['sql'] for query in queries]
+                self.assertLessEqual(
+                    len(executed), self.budgets[name],
+                    '\n'.join([f'{url}: {len(executed)} запросов'] + executed)
+                )
@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from about import urls as about_urls
+from users import urls as users_urls
+
+from .. import urls as posts_urls
+from ..models import Follow, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_dataset', users=30, groups=3, posts=200, comments=300,
+            follows=5, image_share=0.2, image_pool=2, stdout=StringIO(),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_dataset(self):
+        """Данные нужного объёма, с картинками и согласованными счётчиками."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertTrue(Follow.objects.exists())
+        out = StringIO()
+        call_command('recount_counters', stdout=out)
+        self.assertNotRegex(out.getvalue(), r'исправлено [1-9]')
+
+    def test_benchmark_covers_all_routes(self):
+        """Бенчмарк проходит все маршруты и сравнивается с baseline."""
+        output = os.path.join(TEMP_MEDIA_ROOT, 'benchmark.json')
+        options = {'requests': 2, 'warmup': 0, 'output': output,
+                   'stdout': StringIO()}
+        call_command('benchmark', **options)
+        with open(output) as result:
+            routes = json.load(result)['routes']
+        names = {
+            f'{urlconf.app_name}:{pattern.name}'
+            for urlconf in (about_urls, posts_urls, users_urls)
+            for pattern in urlconf.urlpatterns
+        }
+        self.assertEqual(set(routes), names)
+        for name, result in routes.items():
+            with self.subTest(name=name):
+                self.assertLess(max(result['status']), 400)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        out = StringIO()
+        call_command('benchmark', baseline=output, threshold=100,
+                     **dict(options, stdout=out))
+        self.assertNotIn('РЕГРЕССИЯ', out.getvalue())
@@ -1,13 +1,18 @@
+import base64
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import PostForm
+from ..images import oriented
 from ..models import Group, Post, User
+from ..uploads import normalize_image
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -144,3 +149,56 @@ class PostFormTests(TestCase):
         self.assertNotEqual(post.text, form_data['text'])
         self.assertNotEqual(post.group.id, form_data['group'])
         self.assertNotEqual(post.image, form_data['image'])
+
+
+class ImageUploadTests(TestCase):
+    @staticmethod
+    def jpeg_with_exif(size=(40, 20), orientation=6):
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile('photo.jpeg', buffer.getvalue(),
+                                  content_type='image/jpeg')
+
+    def clean_image(self, uploaded):
+        form = PostForm(data={'text': 'Пост'}, files={'image': uploaded})
+        valid = form.is_valid()
+        return valid, form
+
+    @override_settings(IMAGE_WORKERS=1, IMAGE_MAX_SIDE=10)
+    def test_image_normalized_in_pool(self):
+        """EXIF применяется и вырезается, большая сторона уменьшается."""
+        valid, form = self.clean_image(self.jpeg_with_exif())
+        self.assertTrue(valid, form.errors)
+        image = form.cleaned_data['image']
+        self.assertEqual(image.name, 'photo.jpg')
+        with Image.open(image) as normalized:
+            self.assertEqual(normalized.size, (5, 10))
+            self.assertNotIn('exif', normalized.info)
+
+    @override_settings(IMAGE_WORKERS=0, IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше IMAGE_MAX_PIXELS отклоняется по заголовку."""
+        valid, form = self.clean_image(self.jpeg_with_exif())
+        self.assertFalse(valid)
+        self.assertEqual(form.errors['image'], ['Слишком большая картинка'])
+
+    @override_settings(IMAGE_WORKERS=0, IMAGE_MAX_PIXELS=1000)
+    def test_inline_check_keeps_pillow_limit(self):
+        """Проверка в процессе запроса не меняет глобальный лимит Pillow."""
+        limit = Image.MAX_IMAGE_PIXELS
+        valid, form = self.clean_image(self.jpeg_with_exif())
+        self.assertTrue(valid, form.errors)
+        self.assertEqual(Image.MAX_IMAGE_PIXELS, limit)
+
+    def test_placeholder_rotated_without_full_copy(self):
+        """Заглушка повёрнута по EXIF, картинка без поворота не копируется."""
+        data = self.jpeg_with_exif(orientation=6).read()
+        _, _, placeholder = normalize_image(data, 10 ** 6, 100)
+        encoded = placeholder.split(',', 1)[1]
+        with Image.open(BytesIO(base64.b64decode(encoded))) as small:
+            self.assertEqual(small.size, (8, 16))
+        with Image.open(self.jpeg_with_exif(orientation=1)) as image:
+            self.assertIs(oriented(image), image)
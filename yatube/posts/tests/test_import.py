@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class ImportDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(TEMP_DIR, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def ndjson(self, name, rows):
+        return self.write(name, ''.join(
+            json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+    def load(self, model, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_data', model, path, stdout=out, stderr=err,
+                     **options)
+        return out.getvalue(), err.getvalue()
+
+    def import_community(self):
+        self.load('user', self.write(
+            'users.csv', 'username,first_name\nleo,Лев\nanna,Анна\n'))
+        self.load('group', self.ndjson('groups.ndjson', [
+            {'slug': 'cats', 'title': 'Кошки'}]))
+        self.load('post', self.ndjson('posts.ndjson', [
+            {'id': 100, 'text': 'Первый', 'author': 'leo', 'group': 'cats',
+             'pub_date': '2020-01-02T03:04:05+00:00'},
+            {'id': 101, 'text': 'Второй', 'author': 'leo'},
+        ]))
+        self.load('comment', self.ndjson('comments.ndjson', [
+            {'post': 100, 'author': 'anna', 'text': 'Мяу'}]))
+        self.load('follow', self.ndjson('follows.ndjson', [
+            {'user': 'anna', 'author': 'leo'}]))
+
+    def test_import_keeps_ids_dates_and_counters(self):
+        """Импорт сохраняет id и даты и ведёт счётчики, как сигналы."""
+        self.import_community()
+        leo = User.objects.get(username='leo')
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date,
+                         datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Group.objects.get(slug='cats').posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.filter(user=leo).values_list(
+                'posts_count', 'followers_count').get(), (2, 1))
+        anna = User.objects.get(username='anna')
+        self.assertEqual(anna.stats.following_count, 1)
+        self.assertEqual(anna.timeline.count(), 2)
+        out = StringIO()
+        call_command('recount_counters', stdout=out)
+        self.assertNotRegex(out.getvalue(), r'исправлено [1-9]')
+
+    def test_dates_kept_without_ids(self):
+        """Даты из файла сохраняются и у строк без id, auto_now_add цел."""
+        self.load('user', self.ndjson('leo.ndjson', [{'username': 'leo'}]))
+        self.load('post', self.ndjson('dated.ndjson', [
+            {'id': 7, 'text': 'С id', 'author': 'leo',
+             'pub_date': '2019-05-05T00:00:00+00:00'},
+            {'text': 'Без id', 'author': 'leo',
+             'pub_date': '2018-01-01T00:00:00+00:00'},
+            {'text': 'Ещё без id', 'author': 'leo',
+             'pub_date': '2017-01-01T00:00:00+00:00'},
+        ]))
+        self.load('comment', self.ndjson('dated-comments.ndjson', [
+            {'post': 7, 'author': 'leo', 'text': 'Старый',
+             'created': '2019-06-01T00:00:00+00:00'}]))
+        self.assertEqual(
+            dict(Post.objects.values_list('text', 'pub_date__year')),
+            {'С id': 2019, 'Без id': 2018, 'Ещё без id': 2017})
+        self.assertEqual(Comment.objects.get().created.year, 2019)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertTrue(Comment._meta.get_field('created').auto_now_add)
+
+    def test_bad_rows_skipped(self):
+        """Строки с ошибками и повторы пропускаются, остальное пишется."""
+        self.import_community()
+        path = self.write('bad.ndjson', '\n'.join([
+            '{"post": 100, "author": "ghost", "text": "Кто я"}',
+            'не json',
+            '{"post": 999, "author": "leo", "text": "Нет поста"}',
+            '{"post": 101, "author": "leo", "text": "Ответ"}',
+        ]))
+        out, err = self.load('comment', path)
+        self.assertIn('строка 1', err)
+        self.assertIn('строка 2', err)
+        self.assertIn('строка 3: не найден пост 999', err)
+        self.assertNotIn('строка 4', err)
+        self.assertIn('Импортировано 1 из 4', out)
+        self.assertEqual(Comment.objects.count(), 2)
+        _, err = self.load('follow', self.ndjson('follows.ndjson', [
+            {'user': 'anna', 'author': 'leo'},
+            {'user': 'leo', 'author': 'leo'},
+        ]))
+        self.assertIn('самого себя', err)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_queries_per_batch_not_per_row(self):
+        """Число запросов зависит от числа пакетов, а не строк."""
+        self.load('user', self.ndjson('author.ndjson', [{'username': 'leo'}]))
+        counts = []
+        # 50 постов — ещё один INSERT с учётом лимита переменных SQLite
+        for size in (10, 50):
+            path = self.ndjson(f'posts-{size}.ndjson', [
+                {'text': f'Пост {number}', 'author': 'leo'}
+                for number in range(size)])
+            with CaptureQueriesContext(connection) as queries:
+                self.load('post', path, batch_size=500)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Post.objects.count(), 60)
+
+    def test_follow_queries_per_batch_not_per_row(self):
+        """Подписки с дополнением лент — тоже запросы на пакет."""
+        self.load('user', self.ndjson('users.ndjson', [
+            {'username': f'user{number}'} for number in range(61)]))
+        self.load('post', self.ndjson('posts.ndjson', [
+            {'text': 'Пост', 'author': 'user0'}]))
+        counts = []
+        followers = iter(range(1, 61))
+        for size in (10, 50):
+            path = self.ndjson(f'follows-{size}.ndjson', [
+                {'user': f'user{next(followers)}', 'author': 'user0'}
+                for _ in range(size)])
+            with CaptureQueriesContext(connection) as queries:
+                self.load('follow', path, batch_size=500)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertEqual(
+            User.objects.get(username='user60').timeline.count(), 1)
+
+    def test_posts_fan_out_to_existing_followers(self):
+        """Посты, импортированные после подписок, попадают в ленты."""
+        self.load('user', self.write(
+            'users.csv', 'username\nleo\nanna\n'))
+        self.load('follow', self.ndjson('follows.ndjson', [
+            {'user': 'anna', 'author': 'leo'}]))
+        self.load('post', self.ndjson('posts.ndjson', [
+            {'id': 7, 'text': 'С id', 'author': 'leo'},
+            {'text': 'Без id', 'author': 'leo'},
+        ]))
+        anna = User.objects.get(username='anna')
+        self.assertEqual(
+            set(anna.timeline.values_list('post__text', flat=True)),
+            {'С id', 'Без id'})
@@ -1,6 +1,11 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post, User, Comment, Follow
+from ..models import Group, Post, User, Comment, Follow, UserStats
 
 
 class PostModelTest(TestCase):
@@ -51,3 +56,95 @@ class FollowModelTest(TestCase):
         follow = FollowModelTest.follow
         self.assertEqual(str(follow),
                          f'follower: {self.user} author: {self.author}')
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(obj=obj, field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_post_counters(self):
+        """Счётчики постов автора и группы следуют за постами."""
+        post = Post.objects.create(author=self.author, group=self.group,
+                                   text='Тестовый пост')
+        self.assertCounters(self.author.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=1)
+        post.delete()
+        self.assertCounters(self.author.stats, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=0)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста следует за комментариями."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(post=post, author=self.user,
+                                         text='Комментарий')
+        self.assertCounters(post, comments_count=1)
+        comment.delete()
+        self.assertCounters(post, comments_count=0)
+
+    def test_follow_counters(self):
+        """Счётчики подписчиков и подписок следуют за подписками."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertCounters(self.author.stats, followers_count=1)
+        self.assertCounters(self.user.stats, following_count=1)
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertCounters(self.author.stats, followers_count=0)
+        self.assertCounters(self.user.stats, following_count=0)
+
+    def test_drifted_zero_counter_does_not_block_delete(self):
+        """Удаление при обнулённом счётчике не падает и оставляет ноль."""
+        post = Post.objects.create(author=self.author, group=self.group,
+                                   text='Тестовый пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=0)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        post.delete()
+        self.assertCounters(self.author.stats, posts_count=0)
+        self.assertCounters(self.group, posts_count=0)
+
+    def test_loaded_post_save_skips_group_lookup(self):
+        """Правка загруженного поста не перечитывает его группу."""
+        post_id = Post.objects.create(author=self.author, group=self.group,
+                                      text='Тестовый пост').pk
+        post = Post.objects.get(pk=post_id)
+        post.group = self.other_group
+        with CaptureQueriesContext(connection) as queries:
+            post.save()
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith('SELECT')
+            and 'posts_post' in query['sql']
+        ])
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=1)
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.author, group=self.group,
+                            text='Тестовый пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=5)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=5)
+        call_command('recount_counters', chunk_size=1, stdout=StringIO())
+        self.assertCounters(self.author.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
@@ -0,0 +1,33 @@
+from django.test import TestCase
+
+from .query_budget import QueryBudgetMixin
+
+BUDGETS = {
+    'index': 3,
+    'group_list': 4,
+    'profile': 6,
+    'post_detail': 5,
+    'post_comments': 5,
+    'post_create': 3,
+    'post_edit': 5,
+    'add_comment': 7,
+    'follow_index': 4,
+    'search': 5,
+    'profile_follow': 17,
+    'profile_unfollow': 9,
+}
+
+
+class SmallQueryBudgetTests(QueryBudgetMixin, TestCase):
+    posts_count = 10
+    budgets = BUDGETS
+
+
+class MediumQueryBudgetTests(QueryBudgetMixin, TestCase):
+    posts_count = 1000
+    budgets = BUDGETS
+
+
+class LargeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    posts_count = 100000
+    budgets = BUDGETS
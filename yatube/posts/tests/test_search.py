@@ -0,0 +1,68 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import match_expression
+
+SEARCH = 'posts:search'
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.rare = Post.objects.create(
+            text='Про кошек и собак', author=cls.author)
+        cls.often = Post.objects.create(
+            text='Кошки, кошки, кошки и ещё раз кошки', author=cls.author)
+        cls.other = Post.objects.create(
+            text='Про погоду', author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, page=None):
+        data = {'q': query}
+        if page:
+            data['page'] = page
+        response = self.client.get(reverse(SEARCH), data)
+        return list(response.context['page_obj'])
+
+    def test_match_expression(self):
+        """Ввод превращается в слова в кавычках, последнее — префикс."""
+        self.assertEqual(match_expression('Кошки OR "NEAR('),
+                         '"кошки" "or" "near"*')
+        self.assertEqual(match_expression(' *-" '), '')
+
+    def test_ranked_by_relevance(self):
+        """Посты идут по релевантности, последнее слово — префикс."""
+        self.assertEqual(self.found('кош'), [self.often, self.rare])
+        self.assertEqual(self.found('про'), [self.other, self.rare])
+        self.assertEqual(self.found(''), [])
+
+    @override_settings(NUM_OF_POSTS=1)
+    def test_paginated(self):
+        """Результаты делятся на страницы."""
+        self.assertEqual(self.found('кош', page=2), [self.rare])
+
+    def test_index_follows_changes(self):
+        """Индекс следит за правкой, bulk-обновлением и удалением."""
+        post = Post.objects.get(pk=self.rare.pk)
+        post.text = 'Про собак'
+        post.save()
+        self.assertEqual(self.found('кош'), [self.often])
+        Post.objects.filter(pk=self.other.pk).update(text='Кошка')
+        self.assertEqual(set(self.found('кош')), {self.often, self.other})
+        Post.objects.filter(pk=self.often.pk).delete()
+        self.assertEqual(self.found('кош'), [self.other])
+
+    def test_admin_search(self):
+        """Поиск в админке идёт по тому же индексу."""
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'погод'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other])
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+
+from ..models import Post, User
+from ..thumbnails import (batch_thumbnails, enqueue_thumbnails,
+                          generate_thumbnails)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        uploaded = SimpleUploadedFile(
+            name='small.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        return Post.objects.latest('pk')
+
+    def test_original_until_thumbnails_ready(self):
+        """Пока миниатюры строятся, страница показывает оригинал."""
+        post = self.create_post()
+        self.assertFalse(post.thumbnails_ready)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_thumbnails_generated_on_upload(self):
+        """Миниатюры строятся при загрузке, а не при первом показе."""
+        post = self.create_post()
+        self.assertTrue(post.thumbnails_ready)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, post.image.url)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_post_without_image_skipped(self):
+        """Пост без картинки не ставится в очередь."""
+        post = Post.objects.create(text='Без картинки', author=self.user)
+        enqueue_thumbnails(post)
+        post.refresh_from_db()
+        self.assertFalse(post.thumbnails_ready)
+
+    def test_orm_image_change_resets_thumbnails(self):
+        """Новая картинка, сохранённая мимо формы, сбрасывает миниатюры."""
+        post = self.create_post()
+        generate_thumbnails(post.pk)
+        post = Post.objects.get(pk=post.pk)
+        self.assertTrue(post.image_variants.exists())
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00')
+        with mock.patch('posts.signals.enqueue_thumbnails') as enqueue:
+            post.save()
+        enqueue.assert_called_once_with(post)
+        post.refresh_from_db()
+        self.assertFalse(post.thumbnails_ready)
+        self.assertFalse(post.image_variants.exists())
+        with mock.patch('posts.signals.enqueue_thumbnails') as enqueue:
+            post.save()
+        enqueue.assert_not_called()
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_stored_image_name_regenerated(self):
+        """Имя другого файла из хранилища даёт его метаданные и варианты."""
+        post = self.create_post()
+        other = Post.objects.create(
+            text='Другой пост', author=self.user,
+            image=SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00'))
+        post.image = other.image.name
+        post.save()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnails_ready)
+        self.assertEqual(post.image_hash, other.image_hash)
+        self.assertTrue(post.image_placeholder)
+        self.assertEqual(
+            post.image_variants.filter(name='detail').count(), 1)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_admin_created_post(self):
+        """Пост из админки получает заглушку и миниатюры."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:posts_post_add'), data={
+            'text': 'Пост из админки',
+            'author': self.user.pk,
+            'image': SimpleUploadedFile('admin.gif', SMALL_GIF),
+        })
+        post = Post.objects.get(text='Пост из админки')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertTrue(post.thumbnails_ready)
+        self.assertTrue(post.image_variants.exists())
+
+    def kvstore_queries(self, post_id):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(generate_thumbnails(post_id))
+        return [query['sql'] for query in queries
+                if 'thumbnail_kvstore' in query['sql']]
+
+    def test_generation_batches_kvstore(self):
+        """Все миниатюры и варианты пишутся в KV пакетом, а не по одной."""
+        post = self.create_post()
+        written = self.kvstore_queries(post.pk)
+        self.assertEqual(len(written), 3)
+        self.assertEqual(len(self.kvstore_queries(post.pk)), 1)
+        # sorl находит записанные миниатюры и ничего не пишет сам
+        with CaptureQueriesContext(connection) as queries:
+            for geometry, options in settings.POST_THUMBNAILS.values():
+                get_thumbnail(post.image, geometry, **options)
+        self.assertFalse([query for query in queries
+                          if not query['sql'].startswith('SELECT')])
+
+    def test_generation_without_sorl_batching(self):
+        """С незнакомой версией sorl миниатюры строит get_thumbnail."""
+        post = self.create_post()
+        with mock.patch('posts.thumbnails.sorl_batching',
+                        return_value=False), \
+                mock.patch('posts.thumbnails.create_thumbnails') as create:
+            self.assertTrue(generate_thumbnails(post.pk))
+        create.assert_not_called()
+        self.assertTrue(post.image_variants.filter(name='detail').exists())
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            thumbnail = get_thumbnail(post.image, geometry, **options)
+            self.assertTrue(thumbnail.exists())
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_batch_matches_get_thumbnail(self):
+        """Пакет находит те же файлы, что и get_thumbnail."""
+        post = self.create_post()
+        for batching in (True, False):
+            batch = batch_thumbnails([post], 'card', 'detail')
+            with mock.patch('posts.thumbnails.sorl_batching',
+                            return_value=batching):
+                batch.resolved = batch.resolve()
+            for name, (geometry, options) in settings.POST_THUMBNAILS.items():
+                with self.subTest(name=name, batching=batching):
+                    expected = get_thumbnail(post.image, geometry, **options)
+                    self.assertEqual(
+                        batch.get(post, name).name, expected.name)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_list_page_reads_kvstore_once(self):
+        """Миниатюры всей страницы читаются из KV одним запросом."""
+        for _ in range(3):
+            self.create_post()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query['sql'] for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        variant_queries = [
+            query['sql'] for query in queries
+            if 'posts_imagevariant' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1, kvstore_queries)
+        self.assertEqual(len(variant_queries), 1, variant_queries)
+        self.assertContains(response, '<picture>', count=3)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_variants_in_srcset(self):
+        """Варианты всех ширин записаны и попадают в srcset."""
+        post = self.create_post()
+        variants = post.image_variants.filter(name='card')
+        widths, sizes = settings.POST_IMAGE_VARIANTS['card']
+        self.assertEqual(
+            list(variants.values_list('width', flat=True)), list(widths))
+        response = self.client.get(reverse('posts:index'))
+        for variant in variants:
+            with self.subTest(width=variant.width):
+                self.assertContains(
+                    response, f'{variant.file} {variant.width}w')
+        self.assertContains(response, f'sizes="{sizes}"')
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_page_weight(self):
+        """page_weight сравнивает вес страницы до и после srcset."""
+        self.create_post()
+        out = StringIO()
+        call_command('page_weight', '/', viewports=[360], stdout=out)
+        self.assertIn('экран 360px, dpr 2: до', out.getvalue())
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_image_metadata_stored(self):
+        """Размеры, вес, формат и хэш картинки сохраняются при загрузке."""
+        post = self.create_post()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertEqual(post.image_format, 'GIF')
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(SMALL_GIF).hexdigest())
+        detail = post.image_variants.filter(name='detail')
+        self.assertEqual(detail.count(), 1)
+
+    def test_placeholder_rendered(self):
+        """Заглушка считается при загрузке и выводится в карточке."""
+        post = self.create_post()
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(post.image_placeholder), 1000)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image_placeholder)
+
+    def test_backfill_image_metadata(self):
+        """Команда заполняет метаданные старых постов."""
+        post = self.create_post()
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_size=None,
+            image_format='', image_hash='', image_placeholder='')
+        out = StringIO()
+        call_command('backfill_image_metadata', chunk_size=1, stdout=out)
+        self.assertIn('Заполнено 1', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_hash,
+                         hashlib.sha256(SMALL_GIF).hexdigest())
+        self.assertTrue(post.image_placeholder)
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом в шардах по хэшу."""
+        first = self.create_post()
+        second = self.create_post()
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            first.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif')
+
+    def test_upload_hashed_once(self):
+        """Имя в хранилище берётся из хэша метаданных, файл не читается."""
+        with mock.patch('core.storage.content_hash') as content_hash:
+            post = self.create_post()
+        content_hash.assert_not_called()
+        self.assertIn(post.image_hash, post.image.name)
+
+    def test_dedup_refreshes_orphan(self):
+        """Повторная загрузка сироты защищает её от cleanup_images."""
+        orphan = self.create_post()
+        path = orphan.image.path
+        os.utime(path, (0, 0))
+        orphan.delete()
+        kept = self.create_post()
+        self.assertEqual(kept.image.path, path)
+        # Пока новый пост не сохранён, ссылки на файл ещё нет
+        self.assertGreater(os.path.getmtime(path), time.time() - 3600)
+
+    def test_cleanup_images(self):
+        """Удаляется только картинка, на которую не ссылается ни один пост."""
+        kept = self.create_post()
+        uploaded = SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00')
+        orphan = Post.objects.create(
+            text='Удалённый пост', author=self.user, image=uploaded)
+        storage = orphan.image.storage
+        name = orphan.image.name
+        orphan.delete()
+        out = StringIO()
+        call_command('cleanup_images', grace_hours=0, stdout=out)
+        self.assertIn('удалено 1', out.getvalue())
+        self.assertFalse(storage.exists(name))
+        self.assertTrue(storage.exists(kept.image.name))
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_regenerate_thumbnails(self):
+        """Команда строит миниатюры и продолжает с сохранённого id."""
+        first = self.create_post()
+        second = self.create_post()
+        Post.objects.update(thumbnails_ready=False)
+        state_file = os.path.join(TEMP_MEDIA_ROOT, 'progress.json')
+        with open(state_file, 'w') as state:
+            json.dump({'last_pk': first.pk}, state)
+        out = StringIO()
+        call_command('regenerate_thumbnails', workers=0, batch_size=1,
+                     state_file=state_file, stdout=out)
+        self.assertIn('Обработано 1 постов, готово 1', out.getvalue())
+        self.assertFalse(os.path.exists(state_file))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertFalse(first.thumbnails_ready)
+        self.assertTrue(second.thumbnails_ready)
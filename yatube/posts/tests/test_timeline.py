@@ -0,0 +1,119 @@
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User, UserStats
+
+FOLLOW_INDEX = 'posts:follow_index'
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse(FOLLOW_INDEX))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту прежние посты автора."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed(), [self.old_post])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_feed_reads_only_timeline(self):
+        """Лента читается из таблицы ленты без соединения с подписками."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse(FOLLOW_INDEX))
+        feed_queries = [query['sql'] for query in queries
+                        if 'posts_post' in query['sql']]
+        self.assertEqual(len(feed_queries), 1)
+        self.assertIn('posts_timelineentry', feed_queries[0])
+        self.assertNotIn('posts_follow', feed_queries[0])
+
+
+@override_settings(FEED_CELEBRITY_FOLLOWERS=2)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        cls.author = User.objects.create_user(username='author')
+        cls.celebrity = User.objects.create_user(username='celebrity')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.celebrity)
+        Follow.objects.create(user=cls.fan, author=cls.celebrity)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse(FOLLOW_INDEX))
+        return list(response.context['page_obj'])
+
+    def test_celebrity_posts_are_pulled(self):
+        """Посты популярного автора не раскладываются, но есть в ленте."""
+        posts = [
+            Post.objects.create(text='Обычный', author=self.author),
+            Post.objects.create(text='Популярный', author=self.celebrity),
+            Post.objects.create(text='Ещё обычный', author=self.author),
+        ]
+        self.assertFalse(TimelineEntry.objects.filter(
+            author=self.celebrity).exists())
+        response = self.client.get(reverse(FOLLOW_INDEX))
+        self.assertEqual(list(response.context['page_obj']), posts[::-1])
+        self.assertEqual(response.context['paginator'].touched,
+                         {'push': 2, 'pull': 1})
+
+    def test_merged_feed_pages(self):
+        """Слитая лента листается курсором без пропусков и повторов."""
+        posts = [
+            Post.objects.create(text=f'Пост {i}',
+                                author=(self.author, self.celebrity)[i % 2])
+            for i in range(15)
+        ]
+        first_page = self.client.get(
+            reverse(FOLLOW_INDEX)).context['page_obj']
+        second_page = self.client.get(
+            reverse(FOLLOW_INDEX),
+            {'after': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(list(first_page) + list(second_page), posts[::-1])
+
+    def test_former_celebrity_posts_stay_in_feed(self):
+        """Отписки ниже порога не убирают из ленты прежние посты автора."""
+        post = Post.objects.create(text='Популярный', author=self.celebrity)
+        Follow.objects.filter(user=self.fan, author=self.celebrity).delete()
+        self.assertTrue(
+            UserStats.objects.get(user=self.celebrity).feed_pulled)
+        new_post = Post.objects.create(text='Новый', author=self.celebrity)
+        self.assertEqual(self.feed(), [new_post, post])
@@ -1,14 +1,26 @@
+import base64
+import json
 import shutil
 import tempfile
+import time
+from http import HTTPStatus
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.cache import TAG_KEY
+
+from ..cache_tags import group_tags
 from ..models import Group, Post, User, Comment
+from ..templatetags.post_cards import card_version
 
 USERNAME = 'test-username'
 INDEX = 'posts:index'
@@ -157,6 +169,7 @@ class PostPagesTests(TestCase):
 
     def test_post_not_in_your_group(self):
         """Новый пост попал не в свою группу."""
+        cache.clear()
         response = self.authorized_client.get(
             reverse(
                 GROUP_LIST,
@@ -189,16 +202,55 @@ class PostPagesTests(TestCase):
         self.assertNotEqual(Comment.objects.count(), comment_quantity + 1)
 
     def test_cache(self):
-        url = reverse(INDEX)
-        response = self.client.get(url).content
+        """Списки кэшируются и сбрасываются новым постом сразу."""
+        urls = [
+            reverse(INDEX),
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug}),
+            reverse(self.PROFILE, args=[USERNAME]),
+        ]
+        cache.clear()
+        pages = [self.client.get(url).content for url in urls]
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        for url, page in zip(urls, pages):
+            with self.subTest(url=url):
+                self.assertEqual(page, self.client.get(url).content)
         Post.objects.create(
             text='Текст тестовый',
             group=self.group,
             author=self.user
         )
-        self.assertEqual(response, self.client.get(url).content)
+        for url, page in zip(urls, pages):
+            with self.subTest(url=url):
+                self.assertNotEqual(page, self.client.get(url).content)
+
+    def test_cyrillic_slug_cache_keys(self):
+        """Теги групп с кириллицей дают ASCII-ключи, годные memcached."""
+        for tag in group_tags(None, 'кошки и коты'):
+            with self.subTest(tag=tag):
+                key = TAG_KEY.format(tag)
+                self.assertTrue(key.isascii())
+                self.assertNotIn(' ', key)
+
+    def test_cache_untouched_group(self):
+        """Пост в другой группе не сбрасывает кэш группы."""
+        cache.clear()
+        url = reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        page = self.client.get(url).content
+        other_user = User.objects.create_user(username='other')
+        Post.objects.create(text='Чужой пост', author=other_user)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertEqual(page, self.client.get(url).content)
+
+    def test_cache_follow_button(self):
+        """Подписка сбрасывает кэш профиля для подписчика."""
         cache.clear()
-        self.assertNotEqual(response, self.client.get(url).content)
+        reader = User.objects.create_user(username='reader')
+        client = Client()
+        client.force_login(reader)
+        url = reverse(self.PROFILE, args=[USERNAME])
+        self.assertFalse(client.get(url).context['following'])
+        client.get(reverse('posts:profile_follow', args=[USERNAME]))
+        self.assertTrue(client.get(url).context['following'])
 
 
 class TestPaginator(TestCase):
@@ -218,6 +270,9 @@ class TestPaginator(TestCase):
             text='Тестовый текст') for i in range(1, 14))
         Post.objects.bulk_create(cls.post)
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_paginator(self):
         """Правильная работа паджинатора на первой странице."""
         urls = [
@@ -234,12 +289,250 @@ class TestPaginator(TestCase):
     def test_second_page_paginator(self):
         """Правильная работа паджинатора на второй странице."""
         urls = [
-            reverse(INDEX) + '?page=2',
-            reverse(GROUP_LIST,
-                    kwargs={'slug': self.group.slug}) + '?page=2',
-            reverse(self.PROFILE, args=[USERNAME]) + '?page=2',
+            reverse(INDEX),
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug}),
+            reverse(self.PROFILE, args=[USERNAME]),
         ]
         for url in urls:
             with self.subTest(url=url):
-                response = self.authorized_client.get(url)
+                cache.clear()
+                page_obj = self.authorized_client.get(url).context['page_obj']
+                response = self.authorized_client.get(
+                    url, {'after': page_obj.next_cursor})
                 self.assertEqual(len(response.context['page_obj']), 3)
+                self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_previous_page_paginator(self):
+        """Ссылка назад возвращает на первую страницу."""
+        url = reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        first_page = self.authorized_client.get(url).context['page_obj']
+        second_page = self.authorized_client.get(
+            url, {'after': first_page.next_cursor}).context['page_obj']
+        response = self.authorized_client.get(
+            url, {'before': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_forged_cursor_shows_first_page(self):
+        """Поддельный курсор с огромным id или без пояса — первая страница."""
+        forged = [
+            ['2020-01-01T00:00:00+00:00', 10 ** 30],
+            ['2020-01-01T00:00:00', 1],
+        ]
+        for payload in forged:
+            token = base64.urlsafe_b64encode(
+                json.dumps(payload).encode()).decode()
+            for url in (reverse(INDEX),
+                        reverse(self.PROFILE, args=[USERNAME])):
+                for param in ('after', 'before'):
+                    with self.subTest(payload=payload, url=url, param=param):
+                        cache.clear()
+                        response = self.authorized_client.get(
+                            url, {param: token})
+                        self.assertEqual(response.status_code, 200)
+                        self.assertFalse(
+                            response.context['page_obj'].has_previous())
+
+    def test_paginator_without_count(self):
+        """Паджинатор не выполняет COUNT и OFFSET."""
+        url = reverse(GROUP_LIST, kwargs={'slug': self.group.slug})
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(url, {'after': 'broken-cursor'})
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME,
+                                            first_name='Имя')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый текст',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def card_key(self):
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk)
+        return make_template_fragment_key(
+            'post_card', [post.pk, card_version(post)])
+
+    def test_card_cached_once_for_all_lists(self):
+        """Карточка поста кэшируется и общая для всех списков."""
+        self.client.get(reverse(INDEX))
+        key = self.card_key()
+        card = cache.get(key)
+        self.assertIsNotNone(card)
+        cache.set(key, card.replace('Тестовый текст', 'Из кэша'))
+        for url in (
+            reverse(INDEX) + '?fresh',
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', args=[USERNAME]),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Из кэша')
+
+    def test_card_version_follows_author_name(self):
+        """Смена имени автора меняет версию карточки."""
+        self.client.get(reverse(INDEX))
+        old_key = self.card_key()
+        User.objects.filter(pk=self.user.pk).update(first_name='Новое')
+        self.assertNotEqual(self.card_key(), old_key)
+        response = self.client.get(
+            reverse(GROUP_LIST, kwargs={'slug': self.group.slug}))
+        self.assertContains(response, 'Новое')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый текст',
+        )
+        cls.urls = [
+            reverse(INDEX),
+            reverse(GROUP_LIST, kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', args=[USERNAME]),
+            reverse('posts:post_detail', args=[cls.post.pk]),
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def later(self, seconds=2):
+        return mock.patch('core.cache.time.time',
+                          return_value=time.time() + seconds)
+
+    def test_not_modified(self):
+        """Повторный запрос с валидатором получает 304 без рендера."""
+        for url in self.urls:
+            # Версии тегов появляются при первом запросе
+            self.client.get(url)
+            with self.subTest(url=url), self.later():
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                for headers in (
+                    {'HTTP_IF_NONE_MATCH': response['ETag']},
+                    {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+                ):
+                    repeated = self.client.get(url, **headers)
+                    self.assertEqual(repeated.status_code,
+                                     HTTPStatus.NOT_MODIFIED)
+                    self.assertEqual(repeated.templates, [])
+
+    def test_new_csrf_secret_not_modified(self):
+        """После нового входа страница с формой приходит заново."""
+        self.client.force_login(self.user)
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        # Вход меняет CSRF-секрет, браузер получает новую куку
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 32
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_no_last_modified_within_second(self):
+        """Пока не прошла секунда изменения, Last-Modified не отдаётся."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        with self.later(0):
+            response = self.client.get(url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_modified_after_comment(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Комментарий')
+
+    def test_etag_differs_per_user(self):
+        """ETag страницы зависит от того, кто её смотрит."""
+        url = reverse(INDEX)
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+@override_settings(NUM_OF_COMMENTS=3)
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username=USERNAME),
+            text='Тестовый текст',
+        )
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader-{number}'),
+                text=f'Комментарий {number}',
+            )
+        cls.url = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.more_url = reverse('posts:post_comments', args=[cls.post.pk])
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_comments_paginated_by_cursor(self):
+        """Под постом первая порция, остальное — по курсору из ссылки."""
+        first = self.client.get(self.url).context['comments']
+        self.assertEqual(self.texts(first),
+                         ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        response = self.client.get(self.more_url,
+                                   {'after': first.next_cursor})
+        self.assertEqual(self.texts(response.context['comments']),
+                         ['Комментарий 1', 'Комментарий 0'])
+        self.assertNotContains(response, 'Показать ещё')
+        self.assertTemplateNotUsed(response, 'base.html')
+
+    def test_comment_authors_in_one_query(self):
+        """Число запросов не зависит от числа комментариев и авторов."""
+        counts = []
+        for url in (self.url, self.more_url):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts.append(len(queries))
+        Comment.objects.create(
+            post=self.post,
+            author=User.objects.create_user(username='reader-new'),
+            text='Ещё комментарий',
+        )
+        for url, count in zip((self.url, self.more_url), counts):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertEqual(len(queries), count)
+
+    def test_comments_of_missing_post(self):
+        """Комментарии несуществующего поста — 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,444 @@
+import logging
+import mimetypes
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import sorl
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.cache import invalidate_tags
+
+from . import cache_tags
+from .images import file_placeholder, image_metadata
+from .models import ImageVariant, Post
+
+logger = logging.getLogger(__name__)
+
+# Pillow без libwebp оставляет варианты в формате миниатюры
+VARIANT_FORMAT = 'WEBP' if features.check('webp') else None
+
+Srcset = namedtuple('Srcset', 'type srcset sizes')
+
+# Пакеты повторяют внутренние методы sorl этой версии, она же закреплена
+# в requirements.txt; с другой версией работает публичный get_thumbnail
+SORL_VERSION = '12.7.0'
+SORL_INTERNALS = ('_get_thumbnail_filename', '_get_format',
+                  '_create_thumbnail', '_create_alternative_resolutions')
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+@lru_cache(maxsize=None)
+def sorl_batching():
+    """True, если установленный sorl совпадает с тем, что знают пакеты."""
+    return (
+        getattr(sorl, '__version__', None) == SORL_VERSION
+        and all(hasattr(default.backend, name) for name in SORL_INTERNALS)
+    )
+
+
+def variant_geometry(geometry, width):
+    """Геометрия миниатюры, уменьшенная до ширины width."""
+    base_width, _, base_height = geometry.partition('x')
+    if not base_height:
+        return str(width)
+    height = round(int(base_height) * width / int(base_width))
+    return f'{width}x{height}'
+
+
+def useful_widths(widths, source_width, upscale):
+    """Ширины без тех, что дали бы копию уже построенного варианта.
+
+    Без upscale все ширины не меньше ширины оригинала дают одну и ту же
+    картинку, поэтому строится только первая из них.
+    """
+    if upscale or not source_width:
+        return widths
+    useful = []
+    for width in sorted(widths):
+        useful.append(width)
+        if width >= source_width:
+            break
+    return useful
+
+
+def source_file(post):
+    """ImageFile оригинала с размерами, сохранёнными в посте."""
+    source = ImageFile(post.image)
+    if post.image_width and post.image_height:
+        source.set_size((post.image_width, post.image_height))
+    return source
+
+
+def variant_specs(post):
+    """(имя, геометрия, опции) вариантов всех ширин POST_IMAGE_VARIANTS."""
+    specs = []
+    for name, (widths, _) in settings.POST_IMAGE_VARIANTS.items():
+        geometry, options = settings.POST_THUMBNAILS[name]
+        options = dict(options, quality=settings.POST_IMAGE_VARIANT_QUALITY)
+        if VARIANT_FORMAT:
+            options['format'] = VARIANT_FORMAT
+        for width in useful_widths(
+                widths, post.image_width, options.get('upscale')):
+            specs.append((name, variant_geometry(geometry, width), options))
+    return specs
+
+
+def build_variants(post, specs, thumbnails):
+    """ImageVariant для миниатюр, построенных по variant_specs."""
+    variants = []
+    seen = set()
+    for (name, _, _), thumbnail in zip(specs, thumbnails):
+        # Маленький оригинал не растягивается и даёт одинаковые файлы
+        if (name, thumbnail.width) in seen:
+            continue
+        seen.add((name, thumbnail.width))
+        variants.append(ImageVariant(
+            post=post,
+            name=name,
+            file=thumbnail.name,
+            width=thumbnail.width,
+            height=thumbnail.height,
+            size=thumbnail.storage.size(thumbnail.name),
+        ))
+    return variants
+
+
+def create_thumbnails(source, jobs):
+    """Строит файлы миниатюр jobs из одного открытого оригинала."""
+    backend, engine = default.backend, default.engine
+    source_image = engine.get_image(source)
+    try:
+        source.set_size(engine.get_image_size(source_image))
+        image_info = engine.get_image_info(source_image)
+        for geometry, options, thumbnail in jobs:
+            if (not sorl_settings.THUMBNAIL_FORCE_OVERWRITE
+                    and thumbnail.exists()):
+                thumbnail.set_size()
+                continue
+            options = dict(options, image_info=image_info)
+            backend._create_thumbnail(
+                source_image, geometry, options, thumbnail)
+            backend._create_alternative_resolutions(
+                source_image, geometry, options, thumbnail.name)
+    finally:
+        engine.cleanup(source_image)
+
+
+def ensure_thumbnails(source, specs):
+    """Миниатюры source для пар (геометрия, опции), как от get_thumbnail.
+
+    В отличие от get_thumbnail на каждую миниатюру, KV читается и
+    пишется пакетом, а оригинал открывается один раз.
+    """
+    if not sorl_batching():
+        return [get_thumbnail(source, geometry, **options)
+                for geometry, options in specs]
+    jobs = []
+    for geometry, options in specs:
+        options = thumbnail_options(source, options)
+        name = default.backend._get_thumbnail_filename(
+            source, geometry, options)
+        jobs.append((geometry, options, ImageFile(name, default.storage)))
+    found = kvstore_get_many([thumbnail for *_, thumbnail in jobs])
+    missing = {}
+    for job in jobs:
+        if job[2].name not in found:
+            missing.setdefault(job[2].name, job)
+    if missing:
+        create_thumbnails(source, missing.values())
+        found.update(kvstore_set_many(
+            source, [thumbnail for *_, thumbnail in missing.values()]))
+    return [found[thumbnail.name] for *_, thumbnail in jobs]
+
+
+def missing_metadata(post):
+    """Метаданные и заглушка картинки, которых ещё нет в посте."""
+    fields = {}
+    if post.image_hash and post.image_placeholder:
+        return fields
+    with post.image.open('rb'):
+        if not post.image_hash:
+            fields.update(image_metadata(post.image))
+        if not post.image_placeholder:
+            fields['image_placeholder'] = file_placeholder(post.image)
+    return fields
+
+
+def generate_thumbnails(post_id, media_root=None):
+    """Строит все миниатюры и их варианты и помечает пост готовым.
+
+    ``media_root`` — MEDIA_ROOT на момент постановки в очередь: если он
+    с тех пор сменился, задача пропускается, а не пишет в чужой каталог.
+    Возвращает True, если пост помечен готовым.
+    """
+    ready = False
+    if media_root is not None and media_root != settings.MEDIA_ROOT:
+        logger.warning('thumbnails skipped for post %s: MEDIA_ROOT changed',
+                       post_id)
+        return ready
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is None or not post.image:
+            return ready
+        fields = missing_metadata(post)
+        for field, value in fields.items():
+            setattr(post, field, value)
+        fields['thumbnails_ready'] = True
+        specs = variant_specs(post)
+        thumbnails = ensure_thumbnails(source_file(post), [
+            *settings.POST_THUMBNAILS.values(),
+            *((geometry, options) for _, geometry, options in specs),
+        ])
+        variants = build_variants(
+            post, specs, thumbnails[len(settings.POST_THUMBNAILS):])
+        with transaction.atomic():
+            ready = Post.objects.filter(
+                pk=post_id, image=post.image.name
+            ).update(**fields)
+            if ready:
+                ImageVariant.objects.filter(post_id=post_id).delete()
+                ImageVariant.objects.bulk_create(variants)
+        invalidate_tags(*cache_tags.post_changed_tags(post, post.group_id))
+    except Exception:
+        logger.exception('thumbnails failed for post %s', post_id)
+    return bool(ready)
+
+
+def enqueue_thumbnails(post):
+    """Ставит генерацию миниатюр в пул после фиксации транзакции.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры строятся сразу, в том же потоке
+    и в той же транзакции.
+    """
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        generate_thumbnails(post.pk)
+        return
+    media_root = settings.MEDIA_ROOT
+    transaction.on_commit(lambda: submit(post.pk, media_root))
+
+
+def run_job(post_id, media_root):
+    try:
+        return generate_thumbnails(post_id, media_root)
+    finally:
+        close_old_connections()
+
+
+def submit(post_id, media_root):
+    future = executor().submit(run_job, post_id, media_root)
+    with _pending_lock:
+        _pending.add(future)
+    future.add_done_callback(forget)
+
+
+def forget(future):
+    with _pending_lock:
+        _pending.discard(future)
+
+
+def wait_thumbnails(timeout=None):
+    """Ждёт задачи пула, поставленные к этому моменту.
+
+    Нужна тестам и командам, которые после запроса убирают MEDIA_ROOT.
+    """
+    with _pending_lock:
+        pending = set(_pending)
+    return wait(pending, timeout)
+
+
+def thumbnail_options(source, options):
+    """Опции миниатюры, дополненные так же, как в get_thumbnail sorl."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def thumbnail_file(source, geometry, options):
+    """ImageFile миниатюры с тем именем, которое ей даст sorl.
+
+    Повторяет подготовку опций из ThumbnailBackend.get_thumbnail, но не
+    обращается ни к хранилищу, ни к KV.
+    """
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options))
+    return ImageFile(name, default.storage)
+
+
+def kvstore_get_many(thumbnails):
+    """Записи KV для миниатюр: одно чтение кэша и один запрос к БД.
+
+    Для KV-хранилищ, отличных от cached_db, читает по одной записи.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        return {
+            thumbnail.name: kvstore.get(thumbnail) for thumbnail in thumbnails
+        }
+    keys = {add_prefix(thumbnail.key): thumbnail for thumbnail in thumbnails}
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        kvstore.cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return {
+        keys[key].name: deserialize_image_file(value)
+        for key, value in values.items()
+        if isinstance(value, str)
+    }
+
+
+def kvstore_set_many(source, thumbnails):
+    """Записывает в KV оригинал и его миниатюры, как get_thumbnail.
+
+    Для cached_db — один запрос на чтение и по одному на вставку и
+    обновление. Возвращает {имя: ImageFile} записанных миниатюр.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, KVStore):
+        kvstore.get_or_set(source)
+        for thumbnail in thumbnails:
+            kvstore.set(thumbnail, source)
+        return {thumbnail.name: thumbnail for thumbnail in thumbnails}
+    values = {add_prefix(source.key): serialize_image_file(source)}
+    values.update(
+        (add_prefix(thumbnail.key), serialize_image_file(thumbnail))
+        for thumbnail in thumbnails
+    )
+    listed = add_prefix(source.key, 'thumbnails')
+    stored = dict(
+        KVStoreModel.objects.filter(key__in=[*values, listed])
+        .values_list('key', 'value')
+    )
+    keys = set(deserialize(stored[listed])) if listed in stored else set()
+    keys.update(thumbnail.key for thumbnail in thumbnails)
+    values[listed] = serialize(sorted(keys))
+    KVStoreModel.objects.bulk_create([
+        KVStoreModel(key=key, value=value)
+        for key, value in values.items() if key not in stored
+    ], ignore_conflicts=True)
+    KVStoreModel.objects.bulk_update([
+        KVStoreModel(key=key, value=value)
+        for key, value in values.items()
+        if key in stored and stored[key] != value
+    ], ['value'])
+    kvstore.cache.set_many(values, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+    return {thumbnail.name: thumbnail for thumbnail in thumbnails}
+
+
+def load_variants(posts, names):
+    """Варианты картинок постов одним запросом: {(id поста, имя): [...]}."""
+    variants = defaultdict(list)
+    for variant in ImageVariant.objects.filter(
+        post__in=[post.pk for post in posts], name__in=names
+    ):
+        variants[variant.post_id, variant.name].append(variant)
+    return variants
+
+
+def make_srcset(variants, name):
+    """Атрибуты <source> для вариантов или None, если их нет."""
+    if not variants:
+        return None
+    return Srcset(
+        type=mimetypes.guess_type(variants[0].file)[0],
+        srcset=', '.join(
+            f'{default.storage.url(variant.file)} {variant.width}w'
+            for variant in variants
+        ),
+        sizes=settings.POST_IMAGE_VARIANTS[name][1],
+    )
+
+
+class ThumbnailBatch:
+    """Миниатюры и варианты всех постов страницы, прочитанные за один раз.
+
+    Чтение откладывается до первой запрошенной миниатюры, поэтому
+    страница, все карточки которой взяты из кэша фрагментов, в KV не
+    ходит вовсе. С незнакомой версией sorl каждая миниатюра читается
+    через get_thumbnail.
+    """
+
+    def __init__(self, posts, names):
+        self.posts = [
+            post for post in posts if post.image and post.thumbnails_ready
+        ]
+        self.names = names
+        self.resolved = None
+        self.variants = None
+        for post in self.posts:
+            post.thumbnail_batch = self
+
+    def resolve(self):
+        batching = sorl_batching()
+        wanted = {}
+        for post in self.posts:
+            source = ImageFile(post.image)
+            for name in self.names:
+                geometry, options = settings.POST_THUMBNAILS[name]
+                if batching:
+                    wanted[post.pk, name] = thumbnail_file(
+                        source, geometry, options)
+                else:
+                    wanted[post.pk, name] = get_thumbnail(
+                        source, geometry, **options)
+        if not batching:
+            return wanted
+        found = kvstore_get_many(wanted.values())
+        return {
+            key: found.get(thumbnail.name)
+            for key, thumbnail in wanted.items()
+        }
+
+    def get(self, post, name):
+        if self.resolved is None:
+            self.resolved = self.resolve()
+        return self.resolved.get((post.pk, name))
+
+    def get_variants(self, post, name):
+        if self.variants is None:
+            self.variants = load_variants(self.posts, self.names)
+        return self.variants.get((post.pk, name), [])
+
+
+def batch_thumbnails(posts, *names):
+    return ThumbnailBatch(posts, names)
@@ -0,0 +1,185 @@
+import heapq
+import logging
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import CursorPaginator
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_insert(entries):
+    entries = iter(entries)
+    inserted = 0
+    batch = list(islice(entries, BATCH_SIZE))
+    while batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        inserted += len(batch)
+        batch = list(islice(entries, BATCH_SIZE))
+    return inserted
+
+
+def pulled(prefix=''):
+    """Условие на UserStats авторов, чьи посты дочитываются при чтении.
+
+    Автор, который опустился ниже порога после отписок, остаётся в
+    дочитываемых по feed_pulled: его посты времён популярности в ленты
+    не раскладывались.
+    """
+    return (
+        Q(**{f'{prefix}followers_count__gte':
+             settings.FEED_CELEBRITY_FOLLOWERS})
+        | Q(**{f'{prefix}feed_pulled': True})
+    )
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(pulled(), user_id=author_id).exists()
+
+
+def celebrities_followed_by(user):
+    return list(Follow.objects.filter(
+        pulled('author__stats__'), user=user,
+    ).values_list('author_id', flat=True))
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты подписчиков автора.
+
+    Посты авторов с числом подписчиков не меньше
+    FEED_CELEBRITY_FOLLOWERS не раскладываются: их ленты дочитывают
+    при чтении, в том числе после того, как отписки опустят автора
+    ниже порога.
+    """
+    if is_celebrity(post.author_id):
+        return 0
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    with transaction.atomic():
+        pushed = bulk_insert(
+            TimelineEntry(user_id=user_id, post_id=post.pk,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        )
+    logger.debug('feed push: post %s, %s rows', post.pk, pushed)
+    return pushed
+
+
+def fan_out_many(posts):
+    """Раскладывает порцию постов импорта в ленты подписчиков.
+
+    ``posts`` — queryset постов. Запросов на порцию — постоянное число
+    плюс вставки по BATCH_SIZE строк, а не запросы на каждый пост.
+    """
+    rows = list(posts.exclude(pulled('author__stats__')).order_by()
+                .values_list('pk', 'author_id', 'pub_date'))
+    followers = defaultdict(list)
+    for author_id, user_id in Follow.objects.filter(
+        author_id__in={author_id for _, author_id, _ in rows}
+    ).values_list('author_id', 'user_id').iterator():
+        followers[author_id].append(user_id)
+    with transaction.atomic():
+        return bulk_insert(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, author_id, pub_date in rows
+            for user_id in followers[author_id]
+        )
+
+
+def backfill_many(pairs):
+    """Добавляет в ленты подписчиков последние посты новых авторов.
+
+    ``pairs`` — пары (подписчик, автор). Последние TIMELINE_BACKFILL
+    постов всех авторов читаются одним запросом.
+    """
+    authors = {author_id for _, author_id in pairs}
+    authors -= set(UserStats.objects.filter(
+        pulled(), user_id__in=authors).values_list('user_id', flat=True))
+    if not authors:
+        return 0
+    latest = Post.objects.filter(
+        author_id=OuterRef('author_id')
+    ).order_by('-pub_date', '-id').values('pk')[:settings.TIMELINE_BACKFILL]
+    posts = defaultdict(list)
+    for post_id, author_id, pub_date in Post.objects.filter(
+        author_id__in=authors, pk__in=Subquery(latest)
+    ).order_by().values_list('pk', 'author_id', 'pub_date').iterator():
+        posts[author_id].append((post_id, pub_date))
+    with transaction.atomic():
+        return bulk_insert(
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for user_id, author_id in pairs
+            for post_id, pub_date in posts[author_id]
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    return backfill_many([(user_id, author_id)])
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+class FeedPaginator(CursorPaginator):
+    """Сливает разложенную ленту и посты популярных авторов по (pub_date, id).
+
+    Автор мог перейти порог подписчиков после того, как его посты попали
+    в ленты, поэтому одинаковые посты из двух источников схлопываются.
+    В ``touched`` считается, сколько строк прочитал каждый источник.
+    """
+
+    def __init__(self, user, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.push = TimelineEntry.objects.filter(
+            user=user).select_related('post__author', 'post__group')
+        self.celebrities = celebrities_followed_by(user)
+        self.touched = {'push': 0, 'pull': 0}
+
+    def fetch(self, cursor, forward):
+        limit = self.per_page + 1
+        entries = list(
+            self.order(self.push, cursor, forward, 'post_id')[:limit])
+        self.touched['push'] += len(entries)
+        streams = [[entry.post for entry in entries]]
+        if self.celebrities:
+            pulled = list(self.order(
+                Post.objects.filter(author_id__in=self.celebrities)
+                .select_related('author', 'group'),
+                cursor, forward, 'pk')[:limit])
+            self.touched['pull'] += len(pulled)
+            streams.append(pulled)
+        rows, seen = [], set()
+        merged = heapq.merge(*streams, reverse=forward,
+                             key=lambda post: (post.pub_date, post.pk))
+        for post in merged:
+            if post.pk not in seen:
+                seen.add(post.pk)
+                rows.append(post)
+            if len(rows) == limit:
+                break
+        return rows
+
+
+def timeline_page(request, user):
+    paginator = FeedPaginator(user, settings.NUM_OF_POSTS)
+    page_obj = paginator.get_page(
+        request.GET.get('after'),
+        request.GET.get('before'),
+    )
+    logger.debug('feed read: user %s, push %s rows, pull %s rows',
+                 user.pk, paginator.touched['push'],
+                 paginator.touched['pull'])
+    return page_obj
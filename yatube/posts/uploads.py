@@ -0,0 +1,193 @@
+import logging
+import mimetypes
+import os
+import threading
+from concurrent import futures
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from .images import make_placeholder, oriented
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - не POSIX
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Форматы, в которых картинка сохраняется как есть; прочие — в PNG
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+STRIPPED_INFO = ('exif', 'XML:com.adobe.xmp')
+
+_pool = None
+_slots = None
+_lock = threading.Lock()
+
+
+class ImageRejected(Exception):
+    """Картинка не прошла проверку; текст показывается пользователю."""
+
+
+def needs_rewrite(image, max_side):
+    return (
+        image.format not in EXTENSIONS
+        or max(image.size) > max_side
+        or any(key in image.info for key in STRIPPED_INFO)
+    )
+
+
+def decode(data, max_pixels, max_side):
+    """Декодирует картинку целиком и решает, надо ли её пересохранять.
+
+    Анимированные картинки не пересохраняются: пересборка потеряла бы
+    кадры, проверяется только первый.
+
+    Лимит пикселей проверяется по заголовку до декодирования, а не
+    через Image.MAX_IMAGE_PIXELS: это глобальная настройка Pillow, и при
+    IMAGE_WORKERS = 0 она задела бы sorl и админку. Картинка остаётся
+    связанной с буфером в памяти: без поворота по EXIF она возвращается
+    без копии.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        if image.width * image.height > max_pixels:
+            raise ImageRejected('Слишком большая картинка')
+        image.load()
+        rewrite = (not getattr(image, 'is_animated', False)
+                   and needs_rewrite(image, max_side))
+        return oriented(image), image.format, rewrite
+    except Image.DecompressionBombError:
+        raise ImageRejected('Слишком большая картинка')
+    except (OSError, SyntaxError, ValueError, MemoryError):
+        raise ImageRejected('Файл повреждён или не является картинкой')
+
+
+def normalize_image(data, max_pixels, max_side):
+    """Проверяет картинку и пересохраняет её без EXIF, не больше max_side.
+
+    Возвращает байты, формат и заглушку для страницы. Картинка, которую
+    нечего чистить или уменьшать, остаётся байт в байт.
+    """
+    image, image_format, rewrite = decode(data, max_pixels, max_side)
+    placeholder = make_placeholder(image)
+    if not rewrite:
+        return data, image_format, placeholder
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side))
+    for key in STRIPPED_INFO:
+        image.info.pop(key, None)
+    if image_format not in EXTENSIONS:
+        image_format = 'PNG'
+    params = {}
+    if image_format in ('JPEG', 'WEBP'):
+        params['quality'] = 90
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    out = BytesIO()
+    image.save(out, format=image_format, **params)
+    return out.getvalue(), image_format, placeholder
+
+
+def limit_memory(memory):
+    if resource is not None and memory:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def limited_job(data, max_pixels, max_side, cpu_seconds):
+    """normalize_image не дольше cpu_seconds процессорного времени.
+
+    По истечении лимита ядро снимает процесс сигналом SIGXCPU, даже если
+    он застрял внутри декодера Pillow.
+    """
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = used + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    return normalize_image(data, max_pixels, max_side)
+
+
+def pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                mp_context=get_context('spawn'),
+                initializer=limit_memory,
+                initargs=(settings.IMAGE_WORKER_MEMORY,),
+            )
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.IMAGE_QUEUE)
+        return _pool, _slots
+
+
+def replace_pool(broken):
+    global _pool
+    with _lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def run_limited(data):
+    """Нормализует картинку в пуле процессов с лимитами времени и памяти.
+
+    Задачи сверх IMAGE_QUEUE отклоняются сразу, а не ждут в очереди.
+    При IMAGE_WORKERS = 0 картинка обрабатывается в текущем процессе.
+    """
+    args = (data, settings.IMAGE_MAX_PIXELS, settings.IMAGE_MAX_SIDE)
+    if not settings.IMAGE_WORKERS:
+        return normalize_image(*args)
+    executor, slots = pool()
+    if not slots.acquire(blocking=False):
+        raise ImageRejected('Сервер занят обработкой картинок, '
+                            'попробуйте позже')
+    try:
+        future = executor.submit(
+            limited_job, *args, settings.IMAGE_TIMEOUT)
+    except BrokenProcessPool:
+        slots.release()
+        replace_pool(executor)
+        raise ImageRejected('Картинка не прошла проверку, попробуйте ещё раз')
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=settings.IMAGE_TIMEOUT)
+    except futures.TimeoutError:
+        logger.warning('image normalization timed out (%s bytes)', len(data))
+        raise ImageRejected('Картинка обрабатывается слишком долго')
+    except BrokenProcessPool:
+        logger.warning('image worker died (%s bytes)', len(data))
+        replace_pool(executor)
+        raise ImageRejected('Картинка не прошла проверку')
+
+
+def normalize_upload(upload):
+    """Файл после normalize_image с расширением по формату и заглушкой.
+
+    Размер в байтах и пикселях по заголовку, который уже прочитал
+    forms.ImageField, проверяется до отправки в пул.
+    """
+    if upload.size > settings.IMAGE_MAX_BYTES:
+        raise ImageRejected('Слишком большой файл')
+    image = getattr(upload, 'image', None)
+    if image is not None:
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ImageRejected('Слишком большая картинка')
+    upload.seek(0)
+    data, image_format, placeholder = run_limited(upload.read())
+    name = os.path.splitext(upload.name)[0] + '.' + EXTENSIONS[image_format]
+    normalized = SimpleUploadedFile(
+        name, data, mimetypes.guess_type(name)[0])
+    normalized.placeholder = placeholder
+    return normalized
@@ -26,6 +26,11 @@ urlpatterns = [
         views.post_detail,
         name='post_detail'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'create/',
         views.post_create,
@@ -46,6 +51,11 @@ urlpatterns = [
         views.follow_index,
         name='follow_index'
     ),
+    path(
+        'search/',
+        views.search,
+        name='search'
+    ),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
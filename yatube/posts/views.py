@@ -3,54 +3,60 @@ from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.forms.utils import to_current_timezone
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_exempt
 
+from core.cache import cache_tagged_page, conditional_tagged_page
+
+from . import cache_tags
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Comment, Group, Post, User, Follow
+from .paginator import CursorPaginator, paginate
+from .search import search_posts
+from .thumbnails import batch_thumbnails
+from .timeline import timeline_page
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_tagged_page(settings.PAGE_CACHE_TIMEOUT, cache_tags.index_tags)
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(
+        request, Post.objects.select_related('author', 'group'))
+    batch_thumbnails(page_obj, 'card')
     context = {
         'page_obj': page_obj,
-        'paginator': paginator,
+        'paginator': page_obj.paginator,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_tagged_page(settings.PAGE_CACHE_TIMEOUT, cache_tags.group_tags)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.group_with_posts.all()
+    posts = group.group_with_posts.select_related('author')
     title = group.title
     description = group.description
-    paginator = Paginator(posts, settings.NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts)
+    batch_thumbnails(page_obj, 'card')
     context = {
         'group': group,
         'title': title,
         'description': description,
         'page_obj': page_obj,
-        'paginator': paginator,
+        'paginator': page_obj.paginator,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_tagged_page(settings.PAGE_CACHE_TIMEOUT, cache_tags.profile_tags)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    posts = author.posts.select_related('group')
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author
     ).exists()
-    paginator = Paginator(posts, settings.NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts)
+    batch_thumbnails(page_obj, 'card')
     context = {
         'author': author,
         'posts': posts,
@@ -60,8 +66,10 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_tagged_page(cache_tags.post_detail_tags)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     author = post.author
     pub_date = post.pub_date
     form = CommentForm(instance=None)
@@ -70,10 +78,31 @@ def post_detail(request, post_id):
         'author': author,
         'pub_date': pub_date,
         'form': form,
+        'comments': comments_page(request, post.pk),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(request, post_id):
+    """Комментарии поста порцией от новых к старым, вместе с авторами."""
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.NUM_OF_COMMENTS,
+        key='created',
+    )
+    return paginator.get_page(request.GET.get('after'))
+
+
+@conditional_tagged_page(cache_tags.post_detail_tags)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post.pk),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required
 @csrf_exempt
 def post_create(request):
@@ -105,7 +134,7 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
         return redirect('posts:post_detail', post_id=post.id)
     else:
         context = {
@@ -130,16 +159,29 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, settings.NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline_page(request, request.user)
+    batch_thumbnails(page_obj, 'card')
     context = {
         'page_obj': page_obj,
-        'paginator': paginator}
+        'paginator': page_obj.paginator}
     return render(request, 'posts/follow.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = search_posts(
+        Post.objects.select_related('author', 'group'), query)
+    paginator = Paginator(results, settings.NUM_OF_POSTS)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    batch_thumbnails(page_obj, 'card')
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'paginator': paginator,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def profile_follow(request, username):
     follower = get_object_or_404(User, username=request.user.username)
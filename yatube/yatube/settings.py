@@ -30,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -110,12 +112,73 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 NUM_OF_POSTS = 10
+# Комментариев под постом за одну подгрузку
+NUM_OF_COMMENTS = 20
+
+# Сколько последних постов автора попадает в ленту при подписке
+TIMELINE_BACKFILL = 1000
+# С этого числа подписчиков посты автора не раскладываются по лентам,
+# а дочитываются при открытии ленты
+FEED_CELEBRITY_FOLLOWERS = 10000
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Кто отдаёт тело медиафайла: '' — приложение (sendfile через
+# wsgi.file_wrapper, диапазоны через mmap), 'x-accel-redirect' — nginx,
+# 'x-sendfile' — Apache или lighttpd
+MEDIA_SENDFILE = ''
+# internal-location nginx, который смотрит в MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Файлы с sha256 в имени не меняются, их можно кэшировать надолго
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+# Прочие имена (старые загрузки, миниатюры) могут получить новое
+# содержимое и перепроверяются по ETag
+MEDIA_MUTABLE_MAX_AGE = 60 * 60 * 24
+
+# Миниатюры картинок постов: имя -> (геометрия, опции sorl)
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'detail': ('100x100', {'crop': 'center'}),
+}
+# Варианты миниатюр для srcset (WebP, если Pillow его умеет):
+# ширины в пикселях и атрибут sizes
+POST_IMAGE_VARIANTS = {
+    'card': ((320, 640, 960), '(max-width: 960px) 100vw, 960px'),
+    'detail': ((100, 200), '100px'),
+}
+POST_IMAGE_VARIANT_QUALITY = 80
+# Потоков для фоновой генерации миниатюр; 0 — генерировать сразу
+THUMBNAIL_WORKERS = 2
+
+# Проверка и нормализация загруженных картинок в пуле процессов;
+# IMAGE_WORKERS = 0 — в процессе запроса
+IMAGE_WORKERS = 2
+# Задач в пуле сверх этого числа отклоняются сразу
+IMAGE_QUEUE = 8
+IMAGE_TIMEOUT = 10
+IMAGE_WORKER_MEMORY = 1024 * 1024 * 1024
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_SIDE = 4096
+
+# Страницы списков сбрасываются по тегам, таймаут лишь страховка
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Метрики view в формате Prometheus на /metrics. С METRICS_TOKEN
+# эндпоинт отвечает только на Authorization: Bearer <токен>; без него —
+# только адресам METRICS_ALLOWED_IPS и не через прокси: за nginx все
+# запросы приходят с 127.0.0.1, поэтому там нужен токен
+METRICS_ENABLED = True
+METRICS_TOKEN = ''
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# Поиск N+1: одна форма SQL больше NPLUSONE_THRESHOLD раз за ответ
+NPLUSONE_ENABLED = DEBUG
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_RAISE = False
 
 CACHES = {
     'default': {